@@ -0,0 +1,108 @@
+"""
+Checks the downscaling geometry of layout inference without an endpoint.
+
+For 1- and 2-column fixture pages at 200 and 300 dpi, synthetic layout boxes
+are projected onto the copy inference_copy would send at each --widths value
+(as a detector working on that copy would return them), mapped back with
+rescale_predictions, and run through sort_and_merge. The page must keep its
+1/2-column decision and block order, and every box must come back within
+--tolerance of the page width. Exits with 1 on any mismatch.
+
+    python Cleaning/check_layout_geometry.py --widths 827 600
+"""
+import sys
+import argparse
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from PIL import Image
+
+from check_layout_scaling import fixture_page
+from layout_detection import inference_copy, rescale_predictions, sort_and_merge
+from utilities import settings
+
+PAGE_SIZES = [(1654, 2339), (2480, 3508)]  # A4 at 200 and 300 dpi
+
+
+def fixture_boxes(width, height, two_column: bool):
+    """The blocks fixture_page draws, as (box, label_id, score) in page coordinates."""
+    boxes = [([round(width * 0.3), round(height * 0.04), round(width * 0.7), round(height * 0.07)], 6, 0.95)]
+    for top in (0.12, 0.4, 0.65):
+        y1, y2 = round(height * top), round(height * (top + 0.2))
+        if two_column:
+            boxes.append(([round(width * 0.08), y1, round(width * 0.46), y2], 5, 0.9))
+            boxes.append(([round(width * 0.54), y1, round(width * 0.92), y2], 5, 0.9))
+        else:
+            boxes.append(([round(width * 0.08), y1, round(width * 0.92), y2], 5, 0.9))
+    return boxes
+
+def is_two_column(groups_present):
+    return not (groups_present <= {1, 3} or groups_present <= {2, 3})
+
+def check_page(path: Path, two_column: bool, widths, tolerance):
+    """Returns the mismatches for one fixture page, as messages."""
+    image_bytes = path.read_bytes()
+    with Image.open(path) as img:
+        page_width, page_height = img.size
+    boxes = fixture_boxes(page_width, page_height, two_column)
+    expected, expected_groups = sort_and_merge(boxes, page_width)
+    expected_order = [boxes.index(item) for item in expected]
+    problems = []
+    if is_two_column(expected_groups) != two_column:
+        problems.append(f"{path.name}: full resolution gives {'2' if not two_column else '1'}-column")
+
+    settings.LAYOUT_MAX_WIDTH = 0
+    sent, x_factor, y_factor = inference_copy(image_bytes)
+    if sent is not image_bytes or (x_factor, y_factor) != (1.0, 1.0):
+        problems.append(f"{path.name}: LAYOUT_MAX_WIDTH=0 changed the page")
+
+    limit = tolerance * page_width
+    for width in widths:
+        settings.LAYOUT_MAX_WIDTH = width
+        sent, x_factor, y_factor = inference_copy(image_bytes)
+        with Image.open(BytesIO(sent)) as small:
+            sent_width = small.width
+        if sent_width != width:
+            problems.append(f"{path.name} @ {width}px: sent {sent_width}px wide")
+            continue
+
+        # What a detector running on the small copy returns
+        detected = [
+            ([round(x1 / x_factor), round(y1 / y_factor), round(x2 / x_factor), round(y2 / y_factor)], label_id, score)
+            for (x1, y1, x2, y2), label_id, score in boxes
+        ]
+        restored = rescale_predictions(detected, x_factor, y_factor)
+        for box, (original, _, _) in zip(restored, boxes):
+            if max(abs(a - b) for a, b in zip(box[0], original)) > limit:
+                problems.append(f"{path.name} @ {width}px: box {box[0]} instead of {original}")
+
+        merged, groups = sort_and_merge(restored, page_width)
+        if is_two_column(groups) != two_column:
+            problems.append(f"{path.name} @ {width}px: {'2' if is_two_column(groups) else '1'}-column")
+        elif [restored.index(item) for item in merged] != expected_order:
+            problems.append(f"{path.name} @ {width}px: blocks reordered")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--widths", nargs="+", type=int, default=[827, 600], help="LAYOUT_MAX_WIDTH values to check")
+    parser.add_argument("--tolerance", type=float, default=0.005, help="Allowed box difference, share of page width")
+    args = parser.parse_args()
+
+    problems, pages = [], 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        for width, height in PAGE_SIZES:
+            for two_column in (False, True):
+                path = Path(work_dir) / f"{width}_{'2col' if two_column else '1col'}.jpg"
+                fixture_page(path, two_column, width, height)
+                problems += check_page(path, two_column, args.widths, args.tolerance)
+                pages += 1
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"✅ {pages} pages: same layout, order and boxes at {', '.join(map(str, args.widths))}px as at full resolution")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Checks that downscaled layout inference gives the same result as full resolution.
+
+Every page is sent to the layout endpoint (or layout_stub.py through
+LAYOUT_ENDPOINT_URL) once at full resolution and once at each --widths value,
+and the 1/2-column decision and the crop boxes are compared. Boxes may differ
+by --tolerance of the page width. Without page arguments synthetic 1- and
+2-column fixture pages are generated. Exits with 1 on any mismatch.
+
+    LAYOUT_ENDPOINT_URL=http://127.0.0.1:8085 python Cleaning/check_layout_scaling.py --widths 827 600
+    python Cleaning/check_layout_scaling.py temp_2020/*/*.jpg --widths 827
+"""
+import sys
+import argparse
+import tempfile
+from pathlib import Path
+from PIL import Image, ImageDraw
+
+from layout_detection import detect_page, crop_order
+from utilities import settings
+
+
+def fixture_page(path: Path, two_column: bool, width=1654, height=2339):
+    """A4 at 200 dpi with a title bar and lines of "text" in one or two columns."""
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([width * 0.3, height * 0.04, width * 0.7, height * 0.07], fill="black")
+    for y in range(int(height * 0.12), int(height * 0.9), 40):
+        if two_column:
+            draw.rectangle([width * 0.08, y, width * 0.46, y + 18], fill="black")
+            draw.rectangle([width * 0.54, y, width * 0.92, y + 18], fill="black")
+        else:
+            draw.rectangle([width * 0.08, y, width * 0.92, y + 18], fill="black")
+    img.save(path, quality=75)
+
+def make_fixtures(folder: Path):
+    pages = []
+    for i, two_column in enumerate([False, True, False, True], 1):
+        path = folder / f"{i}.jpg"
+        fixture_page(path, two_column)
+        pages.append(path)
+    return pages
+
+def layout_at(path: Path, max_width: int):
+    settings.LAYOUT_MAX_WIDTH = max_width
+    _, predictions, is_two_column = detect_page(path)
+    return is_two_column, [box for box, _, _ in crop_order(predictions)] if is_two_column else []
+
+def compare(path: Path, widths, tolerance):
+    """Returns the mismatches between full resolution and each width, as messages."""
+    with Image.open(path) as img:
+        page_width = img.width
+    limit = tolerance * page_width
+
+    reference = layout_at(path, 0)
+    problems = []
+    for width in widths:
+        is_two_column, boxes = layout_at(path, width)
+        if is_two_column != reference[0]:
+            problems.append(f"{path} @ {width}px: {'2' if is_two_column else '1'}-column, "
+                            f"full resolution says {'2' if reference[0] else '1'}-column")
+        elif len(boxes) != len(reference[1]):
+            problems.append(f"{path} @ {width}px: {len(boxes)} crops instead of {len(reference[1])}")
+        else:
+            for box, expected in zip(boxes, reference[1]):
+                if max(abs(a - b) for a, b in zip(box, expected)) > limit:
+                    problems.append(f"{path} @ {width}px: crop {box} instead of {expected}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages", nargs="*", help="Page images (default: generated fixtures)")
+    parser.add_argument("--widths", nargs="+", type=int, default=[827], help="LAYOUT_MAX_WIDTH values to check")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed box difference, share of page width")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        pages = [Path(p) for p in args.pages] or make_fixtures(Path(work_dir))
+        problems = []
+        for path in pages:
+            problems += compare(path, args.widths, args.tolerance)
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"✅ {len(pages)} pages: same layout and crops at {', '.join(map(str, args.widths))}px as at full resolution")
+
+if __name__ == "__main__":
+    main()
@@ -7,21 +7,27 @@ def run(year: int):
     prefix = f"{year}/"
     temp_dir = Path(f"temp_{year}")
     temp_dir.mkdir(parents=True, exist_ok=True)
+    # Pages whose PDF text layer was good enough arrive as N.txt and go
+    # straight to the merge input, skipping layout detection and OCR
+    text_dir = Path(f"{year}_ocr")
 
     s3 = boto3.client("s3")
 
     paginator = s3.get_paginator("list_objects_v2")
     pages = paginator.paginate(Bucket=settings.DEST_BUCKET, Prefix=prefix)
 
-    print(f"📥 Downloading images for year {year}...")
+    print(f"📥 Downloading pages for year {year}...")
 
     for page in pages:
         for obj in page.get("Contents", []):
             key = obj["Key"]
-            if not key.lower().endswith(".jpg"):
+            if key.lower().endswith((".jpg", ".png")):
+                local_path = temp_dir / Path(key).relative_to(prefix)
+            elif key.lower().endswith(".txt"):
+                local_path = text_dir / Path(key).relative_to(prefix)
+            else:
                 continue
 
-            local_path = temp_dir / Path(key).relative_to(prefix)
             local_path.parent.mkdir(parents=True, exist_ok=True)
 
             print(f"⬇️ {key} → {local_path}")
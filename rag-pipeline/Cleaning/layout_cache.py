@@ -0,0 +1,99 @@
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+import boto3
+from botocore.exceptions import ClientError
+
+
+class LayoutCache:
+    """
+    On-disk cache of layout predictions, keyed by the page's content hash.
+
+    Rows are keyed by (sha256 of the image bytes, version), where the version
+    names everything else that shapes the predictions (endpoint, model version,
+    threshold, inference width), so changing any of them simply misses.
+
+    Attributes:
+    - path : Path
+        The SQLite file.
+    - hits, misses : int
+        Lookups answered and not answered by the cache since it was opened.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " digest TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (digest, version))"
+        )
+        self._conn.commit()
+
+    def get(self, digest, version):
+        """Returns the cached [(box, label_id, score), ...] or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM predictions WHERE digest = ? AND version = ?", (digest, version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [(box, label_id, score) for box, label_id, score in json.loads(row[0])]
+
+    def put(self, digest, version, predictions):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                (digest, version, json.dumps(predictions), time.time()),
+            )
+            self._conn.commit()
+
+    def merge(self, other_path):
+        """Adds the rows of another cache file that this one does not have."""
+        with self._lock:
+            self._conn.execute("ATTACH DATABASE ? AS other", (str(other_path),))
+            try:
+                self._conn.execute("INSERT OR IGNORE INTO predictions SELECT * FROM other.predictions")
+                self._conn.commit()
+            finally:
+                self._conn.execute("DETACH DATABASE other")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def split_s3_uri(uri):
+    parsed = urlparse(uri)
+    return parsed.netloc, parsed.path.lstrip("/")
+
+def pull_from_s3(cache, uri):
+    """Merges the shared cache file at `uri` (s3://bucket/key) into the local cache, if there is one."""
+    bucket, key = split_s3_uri(uri)
+    with tempfile.TemporaryDirectory() as work_dir:
+        local = Path(work_dir) / "layout_cache.sqlite"
+        try:
+            boto3.client("s3").download_file(bucket, key, str(local))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            raise
+        cache.merge(local)
+    return True
+
+def push_to_s3(cache, uri):
+    """Uploads the local cache file to `uri`; call after closing the cache."""
+    bucket, key = split_s3_uri(uri)
+    boto3.client("s3").upload_file(str(cache.path), bucket, key)
@@ -3,13 +3,22 @@ import os
 import json
 import time
 import base64
+import hashlib
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Tuple, Set
 import boto3
-from botocore.exceptions import ClientError, BotoCoreError
+from botocore.config import Config
+from botocore.exceptions import (
+    ClientError, BotoCoreError, ConnectionError as BotoConnectionError, ReadTimeoutError
+)
 from PIL import Image
 from io import BytesIO
 from utilities import settings
+from utilities.concurrency import backoff_delay
+from layout_cache import LayoutCache, pull_from_s3, push_to_s3
 
 # =======================
 # CONFIG — EDIT THESE
@@ -25,12 +34,26 @@ label_names = {
 }
 split_order = ['title', 'text', 'Table', 'footer', 'image']
 
-runtime = boto3.client("sagemaker-runtime", region_name=AWS_REGION)
+# Throttling and cold starts of the serverless endpoint, retried with backoff
+RETRYABLE_CODES = {"ThrottlingException", "ModelNotReadyException", "ServiceUnavailable", "InternalFailure"}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# LAYOUT_ENDPOINT_URL points the client at layout_stub.py instead of SageMaker.
+# Retries are done by invoke_with_retry, and every worker thread needs a connection.
+runtime = boto3.client(
+    "sagemaker-runtime",
+    region_name=AWS_REGION,
+    endpoint_url=settings.LAYOUT_ENDPOINT_URL or None,
+    config=Config(
+        max_pool_connections=max(10, settings.LAYOUT_CONCURRENCY),
+        retries={"mode": "standard", "max_attempts": 1}
+    )
+)
 
 def invoke_endpoint_image_bytes(img: Image.Image, threshold: float = THRESHOLD) -> dict:
     """
     Sends the image as JSON (base64) to the endpoint and returns parsed JSON.
-    (Switch to application/x-image if you prefer raw bytes.)
+    The default request format (LAYOUT_PAYLOAD=json); x-image sends raw bytes (invoke_endpoint_raw).
     """
     buf = BytesIO()
     img.save(buf, format="JPEG")  # or "PNG" if your images are PNG
@@ -49,6 +72,81 @@ def invoke_endpoint_image_bytes(img: Image.Image, threshold: float = THRESHOLD)
     body = resp["Body"].read().decode("utf-8")
     return json.loads(body)
 
+def invoke_endpoint_raw(image_bytes: bytes, threshold: float = THRESHOLD) -> dict:
+    """
+    Sends the page file bytes unchanged as application/x-image; the threshold
+    travels in CustomAttributes. No decode, re-encode or base64 on the client.
+    Only for endpoint containers that read the CustomAttributes threshold.
+    """
+    resp = runtime.invoke_endpoint(
+        EndpointName=ENDPOINT_NAME,
+        ContentType="application/x-image",
+        CustomAttributes=f"threshold={float(threshold)}",
+        Body=image_bytes
+    )
+    body = resp["Body"].read().decode("utf-8")
+    return json.loads(body)
+
+def invoke_endpoint_batch(images: List[bytes], threshold: float = THRESHOLD) -> dict:
+    """
+    Sends several pages in one JSON request:
+      {"instances": [{"image": <base64>}, ...], "threshold": 0.8}
+    and expects one prediction list per page, in order:
+      {"batch_predictions": [[{"box": ..., "label_id": ..., "score": ...}, ...], ...]}
+    """
+    payload = {
+        "instances": [{"image": base64.b64encode(image_bytes).decode("utf-8")} for image_bytes in images],
+        "threshold": float(threshold)
+    }
+    resp = runtime.invoke_endpoint(
+        EndpointName=ENDPOINT_NAME,
+        ContentType="application/json",
+        Body=json.dumps(payload).encode("utf-8")
+    )
+    body = resp["Body"].read().decode("utf-8")
+    return json.loads(body)
+
+def invoke_endpoint(image_bytes: bytes, threshold: float = THRESHOLD) -> dict:
+    """Invokes the endpoint with the LAYOUT_PAYLOAD request format."""
+    if settings.LAYOUT_PAYLOAD == "json":
+        with Image.open(BytesIO(image_bytes)) as img:
+            return invoke_endpoint_image_bytes(img.convert('RGB'), threshold=threshold)
+    return invoke_endpoint_raw(image_bytes, threshold=threshold)
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (BotoConnectionError, ReadTimeoutError)):
+        return True
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return code in RETRYABLE_CODES or status in RETRYABLE_STATUS
+    return False
+
+def invoke_with_retry(image_bytes: bytes, threshold: float = THRESHOLD, invoke=invoke_endpoint) -> dict:
+    """`invoke` (invoke_endpoint by default) with full-jitter exponential backoff on throttling and cold-start errors."""
+    for attempt in range(settings.LAYOUT_MAX_RETRIES + 1):
+        try:
+            return invoke(image_bytes, threshold=threshold)
+        except (ClientError, BotoCoreError) as e:
+            if attempt == settings.LAYOUT_MAX_RETRIES or not is_retryable(e):
+                raise
+            time.sleep(backoff_delay(attempt))
+
+# Status codes with which a model container refuses the request body itself
+FORMAT_REJECTED_STATUS = {400, 415, 422}
+
+def is_unsupported(error: Exception) -> bool:
+    """
+    The model container explicitly rejected the request format (e.g. an older
+    model server without batch support). SageMaker reports that as a ModelError
+    carrying the container's 400/415/422; other 4xx, such as a 413 or a
+    transient ModelError, say nothing about the format.
+    """
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code")
+    return code == "ModelError" and error.response.get("OriginalStatusCode") in FORMAT_REJECTED_STATUS
+
 def convert_predictions_for_pipeline(resp_json: dict) -> List[Tuple[List[int], int, float]]:
     """
     Convert server response -> list of (box, label_id, score) like your local code expected.
@@ -100,12 +198,203 @@ def sort_and_merge(predictions: List[Tuple[List[int], int, float]], image_width:
     groups_present: Set[int] = {1 if group1 else None, 2 if group2 else None, 3 if group3 else None} - {None}
     return merged, groups_present
 
-def run(year: int):
-    base_folder = Path(f"temp_{year}")
-    if not base_folder.exists():
-        print(f"Folder not found: {base_folder}")
+def inference_copy(image_bytes: bytes):
+    """
+    Returns (bytes to send, x factor, y factor). Pages wider than LAYOUT_MAX_WIDTH
+    are sent downscaled, and the factors map the returned boxes back to the
+    original. JPEG pages are decoded in draft mode, directly at 1/2, 1/4 or 1/8
+    size, so the full-resolution image is never decoded.
+    """
+    max_width = settings.LAYOUT_MAX_WIDTH
+    with Image.open(BytesIO(image_bytes)) as img:
+        width, height = img.size
+        if not max_width or width <= max_width:
+            return image_bytes, 1.0, 1.0
+
+        target = (max_width, max(1, round(height * max_width / width)))
+        if img.format == "JPEG":
+            img.draft("RGB", target)
+        small = img.convert("RGB")
+        if small.width > max_width:
+            small = small.resize(target, Image.BILINEAR)
+
+    buf = BytesIO()
+    small.save(buf, format="JPEG", quality=90)
+    return buf.getvalue(), width / small.width, height / small.height
+
+def rescale_predictions(predictions, x_factor: float, y_factor: float):
+    if x_factor == 1.0 and y_factor == 1.0:
+        return predictions
+    return [
+        ([round(x1 * x_factor), round(y1 * y_factor), round(x2 * x_factor), round(y2 * y_factor)], label_id, score)
+        for (x1, y1, x2, y2), label_id, score in predictions
+    ]
+
+class EndpointDetector:
+    """
+    The SageMaker endpoint (or layout_stub.py).
+
+    Detectors share one interface: `predict(images)` takes a list of page file
+    bytes and returns one [(box, label_id, score), ...] list per page in page
+    coordinates; `batch_size` pages are passed per call, `workers` calls may
+    run at once, and `version` identifies the model for the layout cache.
+
+    With LAYOUT_ENDPOINT_BATCH above 1 the pages of a call go in multi-page
+    requests (invoke_endpoint_batch, base64 JSON rather than the raw bytes of
+    LAYOUT_PAYLOAD=x-image) of at most LAYOUT_BATCH_MAX_BYTES. If the endpoint
+    rejects or does not understand that format, the detector switches to one
+    invocation per page for the rest of the run; any other failure of a batch
+    only sends that batch's pages one by one.
+    """
+
+    def __init__(self):
+        self.workers = settings.LAYOUT_CONCURRENCY
+        self.batch_size = max(1, settings.LAYOUT_ENDPOINT_BATCH)
+        self.batching = self.batch_size > 1
+        endpoint = settings.LAYOUT_ENDPOINT_URL or ENDPOINT_NAME
+        self.version = f"{endpoint}|model={settings.LAYOUT_MODEL_VERSION}|width={settings.LAYOUT_MAX_WIDTH}"
+
+    def predict(self, images: List[bytes]):
+        prepared = [inference_copy(image_bytes) for image_bytes in images]
+        results = []
+        for group in self.request_groups(prepared):
+            predictions = self.predict_batch(group) if self.batching and len(group) > 1 else None
+            if predictions is None:
+                predictions = [
+                    convert_predictions_for_pipeline(invoke_with_retry(payload, threshold=THRESHOLD))
+                    for payload, _, _ in group
+                ]
+            results += [
+                rescale_predictions(page_predictions, x_factor, y_factor)
+                for page_predictions, (_, x_factor, y_factor) in zip(predictions, group)
+            ]
+        return results
+
+    def request_groups(self, prepared):
+        """Splits pages into requests under the payload size limit (base64 adds a third)."""
+        if not self.batching:
+            return [[page] for page in prepared]
+        groups, size = [[]], 0
+        for page in prepared:
+            page_size = len(page[0]) * 4 // 3
+            if groups[-1] and size + page_size > settings.LAYOUT_BATCH_MAX_BYTES:
+                groups.append([])
+                size = 0
+            groups[-1].append(page)
+            size += page_size
+        return groups
+
+    def predict_batch(self, group):
+        """Predictions for a multi-page request, or None once the endpoint has shown it cannot batch."""
+        try:
+            resp = invoke_with_retry([payload for payload, _, _ in group], threshold=THRESHOLD,
+                                     invoke=invoke_endpoint_batch)
+            pages = resp.get("batch_predictions")
+            if not isinstance(pages, list) or len(pages) != len(group):
+                raise ValueError("response has no per-page batch_predictions")
+        except (ClientError, ValueError) as e:
+            if isinstance(e, ClientError) and not is_unsupported(e):
+                print(f"⚠️ Batched layout request failed ({e}), sending its {len(group)} pages one by one")
+                return None
+            if self.batching:
+                self.batching = False
+                print(f"⚠️ Layout endpoint does not accept batched requests ({e}), using one request per page")
+            return None
+        return [convert_predictions_for_pipeline({"predictions": page}) for page in pages]
+
+@lru_cache(maxsize=None)
+def get_detector(name: str):
+    """The LAYOUT_BACKEND detector: "endpoint" or "onnx" (local CPU inference, needs onnxruntime)."""
+    if name == "endpoint":
+        return EndpointDetector()
+    if name == "onnx":
+        from layout_onnx import OnnxDetector
+        return OnnxDetector(
+            settings.LAYOUT_ONNX_MODEL,
+            batch_size=settings.LAYOUT_BATCH_SIZE,
+            input_size=(settings.LAYOUT_ONNX_WIDTH, settings.LAYOUT_ONNX_HEIGHT),
+            threads=settings.LAYOUT_ONNX_THREADS
+        )
+    raise ValueError(f"Unknown layout backend: {name}")
+
+def cache_version(detector) -> str:
+    """Everything besides the image that shapes the predictions; changing any of it misses the cache."""
+    return f"{detector.version}|threshold={THRESHOLD}"
+
+def predict_pages(images: List[bytes], detector, cache: LayoutCache = None):
+    """All predictions for each page in its own coordinates; only cache misses reach the detector."""
+    version = cache_version(detector)
+    digests = [hashlib.sha256(image_bytes).hexdigest() for image_bytes in images] if cache else []
+    results = [cache.get(digest, version) for digest in digests] if cache else [None] * len(images)
+
+    missing = [i for i, predictions in enumerate(results) if predictions is None]
+    if missing:
+        for i, predictions in zip(missing, detector.predict([images[i] for i in missing])):
+            results[i] = predictions
+            if cache:
+                cache.put(digests[i], version, predictions)
+    return results
+
+def detect_pages(image_paths: List[Path], detector, cache: LayoutCache = None):
+    """
+    Runs layout detection on page files, as one detector call.
+    Returns (image_bytes, predictions, is_two_column) per page with boxes in the
+    page's own coordinates. With the endpoint at full resolution only the image
+    header is parsed here; the pixels are decoded later and only if the page is cropped.
+    """
+    images = [image_path.read_bytes() for image_path in image_paths]
+    results = []
+    for image_bytes, predictions_full in zip(images, predict_pages(images, detector, cache)):
+        with Image.open(BytesIO(image_bytes)) as img:
+            image_width, _ = img.size
+
+        # Client-side filter (keeps behavior identical to your local code)
+        predictions = [(b, l, s) for (b, l, s) in predictions_full if s >= THRESHOLD and l != 1]
+
+        # ====== Same 2-col vs 1-col logic ======
+        predictions, groups_present = sort_and_merge(predictions, image_width)
+        is_two_column = not (groups_present <= {1, 3} or groups_present <= {2, 3})
+        results.append((image_bytes, predictions, is_two_column))
+    return results
+
+def detect_page(image_path: Path, cache: LayoutCache = None):
+    return detect_pages([image_path], get_detector(settings.LAYOUT_BACKEND), cache)[0]
+
+def crop_order(predictions):
+    """The blocks a 2-column page is cut into, in the order they are numbered."""
+    return sorted(
+        [p for p in predictions if label_names.get(p[1], '') in split_order],
+        key=lambda x: split_order.index(label_names.get(x[1], ''))
+    )
+
+def apply_layout(image_path: Path, image_bytes: bytes, predictions, is_two_column: bool):
+    """Replaces a 2-column page by its cropped blocks; 1-column pages are left untouched."""
+    img_name = image_path.name
+    if not is_two_column:
+        print(f"🟩 1-column: keeping full image {img_name}")
         return
 
+    print(f"🟥 2-column detected in {img_name}")
+    sorted_preds = crop_order(predictions)
+    image_pil = Image.open(BytesIO(image_bytes)).convert('RGB')
+
+    # Replace original with cropped parts
+    image_path.unlink(missing_ok=True)
+    two_col_folder = image_path.parent / image_path.stem
+    if two_col_folder.exists():
+        for f in two_col_folder.iterdir():
+            try: f.unlink()
+            except Exception: pass
+    else:
+        two_col_folder.mkdir(parents=True, exist_ok=True)
+
+    for crop_idx, (box, label_id, _) in enumerate(sorted_preds, 1):
+        x1, y1, x2, y2 = map(int, box)
+        cropped = image_pil.crop((x1, y1, x2, y2))
+        cropped.save(two_col_folder / f"{crop_idx}.jpg")
+
+def list_documents(base_folder: Path):
+    """The page images of each document folder, in folder then page order."""
     for folder in sorted(base_folder.iterdir()):
         if not folder.is_dir():
             continue
@@ -114,53 +403,95 @@ def run(year: int):
             [f for f in os.listdir(folder) if f.lower().endswith(('.png', '.jpg')) and f.split('.')[0].isdigit()],
             key=lambda x: int(x.split('.')[0])
         )
+        if image_files:
+            yield [folder / img_name for img_name in image_files]
 
-        for img_name in image_files:
-            image_path = folder / img_name
-            print(f"📂 Processing: {image_path}")
+def sample_pages(image_paths: List[Path], count: int):
+    """`count` pages spread evenly over the document, first and last included."""
+    if len(image_paths) <= count:
+        return list(image_paths)
+    if count == 1:
+        return [image_paths[len(image_paths) // 2]]
+    step = (len(image_paths) - 1) / (count - 1)
+    return [image_paths[round(i * step)] for i in range(count)]
 
-            image_pil = Image.open(image_path).convert('RGB')
-            image_width, image_height = image_pil.size
+INHERITED = (None, [], False)  # a page that takes the document's 1-column layout without detection
 
-            # ====== Inference via Serverless Endpoint ======
-            try:
-                resp = invoke_endpoint_image_bytes(image_pil, threshold=THRESHOLD)
-            except (ClientError, BotoCoreError) as e:
-                print(f"❌ Invoke failed for {img_name}: {e}")
+def detect_document(image_paths: List[Path], detector, cache: LayoutCache = None, sample_size: int = 3):
+    """
+    Detects a document's layout on `sample_size` sample pages first. When they
+    all are 1-column, the other pages inherit that (INHERITED, no detector
+    call); otherwise every remaining page is detected. Returns one
+    (image_bytes, predictions, is_two_column) per page, in order.
+    """
+    sample = sample_pages(image_paths, sample_size)
+    results = dict(zip(sample, detect_pages(sample, detector, cache)))
+    if not any(is_two_column for _, _, is_two_column in results.values()):
+        return [results.get(image_path, INHERITED) for image_path in image_paths]
+
+    rest = [image_path for image_path in image_paths if image_path not in results]
+    for start in range(0, len(rest), detector.batch_size):
+        batch = rest[start:start + detector.batch_size]
+        results.update(zip(batch, detect_pages(batch, detector, cache)))
+    return [results[image_path] for image_path in image_paths]
+
+def run(year: int):
+    base_folder = Path(f"temp_{year}")
+    if not base_folder.exists():
+        print(f"Folder not found: {base_folder}")
+        return
+
+    # Predictions of unchanged pages come from the cache instead of the endpoint
+    cache = LayoutCache(settings.LAYOUT_CACHE_PATH) if settings.LAYOUT_CACHE_PATH else None
+    if cache and settings.LAYOUT_CACHE_S3_URI:
+        try:
+            pull_from_s3(cache, settings.LAYOUT_CACHE_S3_URI)
+        except (ClientError, BotoCoreError) as e:
+            print(f"⚠️ Could not fetch layout cache from {settings.LAYOUT_CACHE_S3_URI}: {e}")
+
+    detector = get_detector(settings.LAYOUT_BACKEND)
+
+    # Up to `detector.workers` calls of `detector.batch_size` pages are in
+    # flight; results are applied (cropped or kept) strictly in page order,
+    # from a bounded window.
+    window = deque()
+
+    def finish_oldest():
+        image_paths, future = window.popleft()
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"❌ Layout detection failed for {', '.join(p.name for p in image_paths)}: {e}")
+            return
+        for image_path, (image_bytes, predictions, is_two_column) in zip(image_paths, results):
+            if image_bytes is None:
+                print(f"🟩 1-column (inherited from sample pages): keeping full image {image_path.name}")
                 continue
+            apply_layout(image_path, image_bytes, predictions, is_two_column)
 
-            # Convert + client-side filter (keeps behavior identical to your local code)
-            predictions_full = convert_predictions_for_pipeline(resp)
-            predictions = [(b, l, s) for (b, l, s) in predictions_full if s >= THRESHOLD and l != 1]
-
-            # ====== Same 2-col vs 1-col logic ======
-            predictions, groups_present = sort_and_merge(predictions, image_width)
-            is_two_column = not (groups_present <= {1, 3} or groups_present <= {2, 3})
-
-            if is_two_column:
-                print(f"🟥 2-column detected in {img_name}")
-                sorted_preds = sorted(
-                    [p for p in predictions if label_names.get(p[1], '') in split_order],
-                    key=lambda x: split_order.index(label_names.get(x[1], ''))
-                )
-
-                # Replace original with cropped parts
-                image_path.unlink(missing_ok=True)
-                two_col_folder = folder / Path(img_name).stem
-                if two_col_folder.exists():
-                    for f in two_col_folder.iterdir():
-                        try: f.unlink()
-                        except Exception: pass
-                else:
-                    two_col_folder.mkdir(parents=True, exist_ok=True)
-
-                for crop_idx, (box, label_id, _) in enumerate(sorted_preds, 1):
-                    x1, y1, x2, y2 = map(int, box)
-                    cropped = image_pil.crop((x1, y1, x2, y2))
-                    cropped.save(two_col_folder / f"{crop_idx}.jpg")
-            else:
-                print(f"🟩 1-column: keeping full image {img_name}")
-                # just re-save (no change)
-                image_pil.save(image_path)
+    with ThreadPoolExecutor(max_workers=detector.workers) as executor:
+        def submit(image_paths, task, *args):
+            window.append((image_paths, executor.submit(task, image_paths, detector, cache, *args)))
+            if len(window) >= 2 * detector.workers:
+                finish_oldest()
 
+        for image_paths in list_documents(base_folder):
+            print(f"📂 Processing: {image_paths[0].parent} ({len(image_paths)} pages)")
+            if settings.LAYOUT_SAMPLE_PAGES:
+                # Mostly 1-column corpus: a few sample pages decide for the whole document
+                submit(image_paths, detect_document, settings.LAYOUT_SAMPLE_PAGES)
+                continue
+            # Batches hold the pages of one document
+            for start in range(0, len(image_paths), detector.batch_size):
+                submit(image_paths[start:start + detector.batch_size], detect_pages)
+        while window:
+            finish_oldest()
 
+    if cache:
+        print(f"🗃️ Layout cache: {cache.hits} hits, {cache.misses} pages inferred")
+        cache.close()
+        if settings.LAYOUT_CACHE_S3_URI and cache.misses:
+            try:
+                push_to_s3(cache, settings.LAYOUT_CACHE_S3_URI)
+            except (ClientError, BotoCoreError) as e:
+                print(f"⚠️ Could not upload layout cache to {settings.LAYOUT_CACHE_S3_URI}: {e}")
@@ -0,0 +1,77 @@
+import hashlib
+from io import BytesIO
+from pathlib import Path
+from typing import List
+import numpy as np
+from PIL import Image
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional, only needed for LAYOUT_BACKEND=onnx
+    ort = None
+
+
+class OnnxDetector:
+    """
+    Runs an ONNX export of the layout model locally on CPU, several pages per forward pass.
+
+    Expected export: one float32 input of shape [N, 3, H, W] (RGB scaled to
+    0..1) and three outputs, boxes [N, K, 4] as x1, y1, x2, y2 in input pixels,
+    labels [N, K] and scores [N, K], padded with score 0. Pages are resized to
+    the model's input size (or `input_size` when the model's is dynamic) and
+    the boxes are scaled back to page coordinates.
+
+    Attributes:
+    - batch_size : int
+        Pages per forward pass.
+    - workers : int
+        Calls run at once: one decodes the next batch while another runs.
+    - version : str
+        Model file name and content hash, part of the layout cache key.
+    """
+
+    def __init__(self, model_path, batch_size=4, input_size=(800, 1131), threads=0, workers=2):
+        if ort is None:
+            raise ImportError("onnxruntime is not installed (pip install onnxruntime)")
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        _, _, height, width = model_input.shape
+        static = isinstance(width, int) and isinstance(height, int)
+        self.input_size = (width, height) if static else tuple(input_size)
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+
+        digest = hashlib.sha256(Path(model_path).read_bytes()).hexdigest()[:16]
+        self.version = f"onnx:{Path(model_path).name}:{digest}"
+
+    def prepare(self, image_bytes: bytes):
+        """Returns the CHW input array and the (x, y) factors back to page coordinates."""
+        with Image.open(BytesIO(image_bytes)) as img:
+            width, height = img.size
+            if img.format == "JPEG":
+                img.draft("RGB", self.input_size)
+            rgb = img.convert("RGB").resize(self.input_size, Image.BILINEAR)
+        array = np.asarray(rgb, dtype=np.float32).transpose(2, 0, 1) / 255.0
+        return array, (width / self.input_size[0], height / self.input_size[1])
+
+    def predict(self, images: List[bytes]):
+        """Returns one [(box, label_id, score), ...] list per page."""
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            prepared = [self.prepare(image_bytes) for image_bytes in images[start:start + self.batch_size]]
+            batch = np.stack([array for array, _ in prepared])
+            boxes, labels, scores = self.session.run(None, {self.input_name: batch})[:3]
+
+            for i, (_, (x_factor, y_factor)) in enumerate(prepared):
+                results.append([
+                    ([round(float(x1) * x_factor), round(float(y1) * y_factor),
+                      round(float(x2) * x_factor), round(float(y2) * y_factor)], int(label), float(score))
+                    for (x1, y1, x2, y2), label, score in zip(boxes[i], labels[i], scores[i])
+                    if score > 0
+                ])
+        return results
@@ -0,0 +1,150 @@
+"""
+Local stand-in for the SageMaker layout endpoint.
+
+Serves POST /endpoints/<name>/invocations like sagemaker-runtime, accepting
+the raw image (application/x-image), the base64 JSON payload and the
+multi-page {"instances": [...]} payload, and answers in the endpoint's
+{"predictions": [...]} (or {"batch_predictions": [[...], ...]}) format. Instead of the model it looks
+for a nearly blank vertical gutter in the middle of the page: pages with ink
+on both sides of one get a title box and two text columns, other pages one
+text box.
+
+    python Cleaning/layout_stub.py --port 8085 --latency 0.2 --throttle 0.1
+    LAYOUT_ENDPOINT_URL=http://127.0.0.1:8085 python Cleaning/main.py --years 2020
+
+boto3 still signs requests, so any AWS credentials (even fake ones) must be set.
+"""
+import json
+import time
+import random
+import base64
+import argparse
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+
+PROFILE_WIDTH = 200  # pages are analysed at this width
+INK_LEVEL = 128      # gray value below which a pixel counts as ink
+
+
+def column_profile(img: Image.Image):
+    """Share of ink pixels in every column of a PROFILE_WIDTH-wide grayscale copy."""
+    small = img.convert("L").resize((PROFILE_WIDTH, max(1, img.height * PROFILE_WIDTH // img.width)))
+    width, height = small.size
+    pixels = small.load()
+    return [sum(1 for y in range(height) if pixels[x, y] < INK_LEVEL) / height for x in range(width)]
+
+def predict(image_bytes: bytes, threshold: float = 0.8):
+    with Image.open(BytesIO(image_bytes)) as img:
+        width, height = img.size
+        profile = column_profile(img)
+
+    scale = width / PROFILE_WIDTH
+    middle = profile[int(PROFILE_WIDTH * 0.4):int(PROFILE_WIDTH * 0.6)]
+    left, right = profile[:int(PROFILE_WIDTH * 0.4)], profile[int(PROFILE_WIDTH * 0.6):]
+    # Centre of the lightest stretch, so the split does not depend on the page resolution
+    lightest = [i for i, v in enumerate(middle) if v <= min(middle) + 0.01]
+    gutter = (lightest[0] + lightest[-1] + 1) / 2 + int(PROFILE_WIDTH * 0.4)
+
+    title = {"box": [int(width * 0.2), int(height * 0.03), int(width * 0.8), int(height * 0.08)],
+             "label_id": 6, "label": "title", "score": 0.95}
+    # Titles and stamps may cross the gutter, so it only has to be much lighter than the columns
+    ink = min(max(left), max(right))
+    if ink > 0.05 and min(middle) < 0.25 * ink:
+        split, margin = int(gutter * scale), int(width * 0.006)
+        predictions = [
+            title,
+            {"box": [split + margin, int(height * 0.1), int(width * 0.95), int(height * 0.95)],
+             "label_id": 5, "label": "text", "score": 0.93},
+            {"box": [int(width * 0.05), int(height * 0.1), split - margin, int(height * 0.95)],
+             "label_id": 5, "label": "text", "score": 0.92},
+        ]
+    else:
+        predictions = [
+            title,
+            {"box": [int(width * 0.05), int(height * 0.1), int(width * 0.95), int(height * 0.95)],
+             "label_id": 5, "label": "text", "score": 0.94},
+        ]
+    return [p for p in predictions if p["score"] >= threshold]
+
+
+def parse_threshold(custom_attributes: str, default: float = 0.8):
+    for part in (custom_attributes or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip() == "threshold":
+            return float(value)
+    return default
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    throttle = 0.0  # share of requests answered with a ThrottlingException
+    batch = True    # accept {"instances": [...]} multi-page requests
+
+    def send_aws_error(self, status, error_type, message, **fields):
+        data = json.dumps({"message": message, **fields}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("x-amzn-ErrorType", error_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.endswith("/invocations"):
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get("Content-Type", "")
+        threshold = parse_threshold(self.headers.get("X-Amzn-SageMaker-Custom-Attributes"))
+
+        time.sleep(self.latency)
+        if random.random() < self.throttle:
+            self.send_aws_error(429, "ThrottlingException", "Rate exceeded")
+            return
+        try:
+            if not content_type.startswith("application/json"):
+                result = {"predictions": predict(body, threshold)}
+            else:
+                payload = json.loads(body)
+                threshold = float(payload.get("threshold", threshold))
+                if "instances" in payload:
+                    if not self.batch:
+                        raise ValueError("batched requests are not supported")
+                    result = {"batch_predictions": [
+                        predict(base64.b64decode(item["image"]), threshold) for item in payload["instances"]
+                    ]}
+                else:
+                    result = {"predictions": predict(base64.b64decode(payload["image"]), threshold)}
+        except Exception as e:
+            # What SageMaker returns when the container answers 400
+            self.send_aws_error(424, "ModelError", str(e), OriginalStatusCode=400, OriginalMessage=str(e))
+            return
+
+        data = json.dumps(result).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8085, latency=0.0, throttle=0.0, batch=True):
+    StubHandler.latency = latency
+    StubHandler.throttle = throttle
+    StubHandler.batch = batch
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    print(f"🧪 Layout stub listening on http://127.0.0.1:{port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Share of requests to throttle (429)")
+    parser.add_argument("--no-batch", action="store_true", help="Reject multi-page requests like an older model server")
+    args = parser.parse_args()
+    serve(args.port, args.latency, args.throttle, batch=not args.no_batch)
@@ -1,99 +1,380 @@
 import os
 import csv
 import json
+import time
+import hashlib
 import boto3
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import documentai_v1 as documentai
-from google.protobuf.json_format import MessageToDict
+from google.protobuf.json_format import MessageToDict, ParseDict
+from google.protobuf import field_mask_pb2
 from utilities import settings
+from utilities.concurrency import backoff_delay
 from credentials import GCP_OCR_CRED
 # ocr.py
 from google.cloud import documentai_v1 as documentai
 from google.oauth2 import service_account
+from google.api_core import exceptions as gcp_exceptions
+from rate_limit import per_minute
+from ocr_batch import pack_images, split_document
+from ocr_cache import OcrCache
+from ocr_artifact import SUFFIX, require_zstandard, write_artifact, unpack_documents
+from upload_queue import UploadQueue
 
 # GCP_OCR_CRED must be a Python dict with the service-account JSON fields
 creds = service_account.Credentials.from_service_account_info(GCP_OCR_CRED)
 
 client = documentai.DocumentProcessorServiceClient(credentials=creds)
 
+# os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(GCP_OCR_CRED)
+# client = documentai.DocumentProcessorServiceClient()
+processor_name = client.processor_path(settings.project_id, settings.location, settings.processor_id)
+if settings.OCR_PROCESSOR_VERSION:
+    processor_name = client.processor_version_path(
+        settings.project_id, settings.location, settings.processor_id, settings.OCR_PROCESSOR_VERSION
+    )
+
+# Every request, from every worker, takes a token: keeps us under the processor quota
+limiter = per_minute(settings.OCR_REQUESTS_PER_MINUTE)
+
+# Lean runs only read the text and token confidences of the response
+LEAN_FIELD_MASK = "text,pages.tokens"
+
+def field_mask() -> str:
+    """
+    The Document fields to request, comma-separated, "" for the whole document.
+    ProcessRequest.field_mask only takes `{document_field}` or `pages.{page_field}`
+    paths. Multi-page requests also need each page's layout (its text anchor)
+    to be split back.
+    """
+    mask = settings.OCR_FIELD_MASK or (LEAN_FIELD_MASK if settings.OCR_LEAN else "")
+    paths = [path.strip() for path in mask.split(",") if path.strip()]
+    for path in paths:
+        if path.count(".") > 1 or (path.count(".") == 1 and not path.startswith("pages.")):
+            raise ValueError(f"OCR_FIELD_MASK path {path!r} is not a document or pages.<field> path")
+    if paths and settings.OCR_BATCH_PAGES > 1 and not {"pages", "pages.layout"} & set(paths):
+        paths.append("pages.layout")
+    return ",".join(paths)
+
+FIELD_MASK = field_mask()
+
+# Quota and timeout errors are retried with backoff, anything else fails the image
+RETRYABLE_ERRORS = (
+    gcp_exceptions.ResourceExhausted,
+    gcp_exceptions.DeadlineExceeded,
+    gcp_exceptions.ServiceUnavailable,
+)
+
+
+def get_mime_type(file_path: Path):
+    ext = file_path.suffix.lower()
+    if ext == ".png": return "image/png"
+    elif ext in {".jpg", ".jpeg"}: return "image/jpeg"
+    else: raise ValueError(f"Unsupported file type: {ext}")
+
+def cache_version() -> str:
+    """The processor, its version and the field mask; results requested differently miss the OCR cache."""
+    version = f"{settings.processor_id}@{settings.OCR_PROCESSOR_VERSION or 'default'}"
+    return f"{version}#{FIELD_MASK}" if FIELD_MASK else version
+
+def cached_result(cache: OcrCache, digest: str):
+    """The (text, avg_conf, document) stored for an image hash, or None."""
+    stored = cache.get(digest, cache_version())
+    if stored is None:
+        return None
+    document_bytes, avg_conf = stored
+    document = documentai.Document.deserialize(document_bytes)
+    return document.text or "", avg_conf, document
+
+def store_result(cache: OcrCache, digest: str, result):
+    text, avg_conf, document = result
+    if document is not None:
+        cache.put(digest, cache_version(), documentai.Document.serialize(document), avg_conf)
+
+def process_document(content: bytes, mime_type: str):
+    """One rate-limited process_document call, retried with full-jitter backoff on RETRYABLE_ERRORS."""
+    request = {"name": processor_name, "raw_document": documentai.RawDocument(content=content, mime_type=mime_type)}
+    if FIELD_MASK:
+        request["field_mask"] = field_mask_pb2.FieldMask(paths=FIELD_MASK.split(","))
+    for attempt in range(settings.OCR_MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            response = client.process_document(request=request)
+            return response.document
+        except RETRYABLE_ERRORS as e:
+            if attempt == settings.OCR_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, base=1.0, cap=60.0)
+            print(f"⏳ {type(e).__name__}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def summarize(document):
+    text = document.text or ""
+    confidences = [token.layout.confidence for page in document.pages for token in page.tokens]
+    avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, avg_conf, document
+
+def process_image(image_path: Path, cache: OcrCache = None, lookup: bool = True):
+    """`lookup=False` skips the cache lookup (but still stores) when the caller already missed on it."""
+    try:
+        with open(image_path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest() if cache else None
+        if cache and lookup:
+            result = cached_result(cache, digest)
+            if result is not None:
+                return result
+        mime_type = get_mime_type(image_path)
+        result = summarize(process_document(content, mime_type))
+        if cache:
+            store_result(cache, digest, result)
+        return result
+    except Exception as e:
+        print(f"❌ Failed to process {image_path}: {e}")
+        return "", 0.0, None
+
+def process_batch(image_paths, cache: OcrCache = None):
+    """
+    OCRs several images in one multi-page request and splits the result back
+    into one (text, avg_conf, document) per image, the same as process_image
+    would return. Images already in the cache are left out of the request.
+    Falls back to one request per image if the batch fails.
+    """
+    results = [None] * len(image_paths)
+    digests = [hashlib.sha256(path.read_bytes()).hexdigest() for path in image_paths] if cache else []
+    if cache:
+        results = [cached_result(cache, digest) for digest in digests]
+    todo = [i for i, result in enumerate(results) if result is None]
+    if len(todo) <= 1:
+        for i in todo:
+            results[i] = process_image(image_paths[i], cache, lookup=False)
+        return results
+
+    batch = [image_paths[i] for i in todo]
+    try:
+        content, mime_type = pack_images(batch)
+        document = process_document(content, mime_type)
+        if len(document.pages) != len(batch):
+            raise ValueError(f"{len(document.pages)} pages returned for {len(batch)} images")
+        for i, part in zip(todo, split_document(document)):
+            results[i] = summarize(part)
+            if cache:
+                store_result(cache, digests[i], results[i])
+    except Exception as e:
+        print(f"⚠️ Batch of {len(batch)} images failed ({e}), sending them one by one")
+        for i in todo:
+            results[i] = process_image(image_paths[i], cache, lookup=False)  # 👈 misses were counted above
+    return results
+
+def make_batches(images):
+    """Splits images into runs of at most OCR_BATCH_PAGES pages and OCR_BATCH_MAX_BYTES."""
+    batches, size = [[]], 0
+    for image in images:
+        image_size = image.stat().st_size
+        if batches[-1] and (len(batches[-1]) == settings.OCR_BATCH_PAGES
+                            or size + image_size > settings.OCR_BATCH_MAX_BYTES):
+            batches.append([])
+            size = 0
+        batches[-1].append(image)
+        size += image_size
+    return [batch for batch in batches if batch]
+
+
+def list_items(folder: Path):
+    """
+    Yields (item, images) in output order: a page image is its own single
+    image, a 2-column page folder lists its crops in order.
+    """
+    for item in sorted(folder.iterdir()):
+        if item.is_file() and item.suffix.lower() in [".png", ".jpg", ".jpeg"]:
+            yield item, [item]
+        elif item.is_dir():
+            yield item, sorted(item.glob("*.[pj][pn]g"))
+
+def submit_folder(executor, items, cache: OcrCache = None):
+    """
+    Submits the OCR of one document folder and returns, per item, a function
+    that waits for and returns the item's results. With OCR_BATCH_PAGES above
+    1 all the folder's images, crops included, go in multi-page requests.
+    """
+    if settings.OCR_BATCH_PAGES <= 1:
+        getters = []
+        for _, images in items:
+            futures = [executor.submit(process_image, image, cache) for image in images]
+            getters.append(lambda futures=futures: [future.result() for future in futures])
+        return getters
+
+    images = [image for _, item_images in items for image in item_images]
+    located = []
+    for batch in make_batches(images):
+        future = executor.submit(process_batch, batch, cache)
+        located += [(future, i) for i in range(len(batch))]
+
+    getters, first = [], 0
+    for _, item_images in items:
+        mine = located[first:first + len(item_images)]
+        getters.append(lambda mine=mine: [future.result()[i] for future, i in mine])
+        first += len(item_images)
+    return getters
+
+def hydrate_cache(cache: OcrCache, s3, year: int, input_base: Path):
+    """
+    Seeds the cache from the artifacts (or legacy JSON) already uploaded to
+    s3_bucket_ocr for this year, keyed by the hash of the matching local page
+    image. Only single
+    pages are taken: crops depend on the layout run that cut them, so a stored
+    crop list may not line up with today's crops. The results are assumed to
+    come from the configured processor version.
+    """
+    added = 0
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=settings.s3_bucket_ocr, Prefix=f"{year}/"):
+        for obj in page.get("Contents", []):
+            key = Path(obj["Key"])
+            if key.name.endswith(SUFFIX):
+                stem = key.name[:-len(SUFFIX)]
+            elif key.suffix == ".json" and key.stem.isdigit():
+                stem = key.stem
+            else:
+                continue
+            images = [input_base / key.parent.name / f"{stem}{ext}" for ext in (".jpg", ".jpeg", ".png")]
+            image = next((path for path in images if path.is_file()), None)
+            if image is None:
+                continue
+            digest = hashlib.sha256(image.read_bytes()).hexdigest()
+            if cache.has(digest, cache_version()):
+                continue
+            body = s3.get_object(Bucket=settings.s3_bucket_ocr, Key=obj["Key"])["Body"].read()
+            if key.name.endswith(SUFFIX):
+                documents = unpack_documents(body)
+                if len(documents) != 1:
+                    continue
+                document = documents[0]
+            else:
+                body = json.loads(body)
+                if not isinstance(body, dict):
+                    continue
+                document = documentai.Document.wrap(ParseDict(body, documentai.Document.pb()()))
+            store_result(cache, digest, summarize(document))
+            added += 1
+    print(f"🗃️ Hydrated OCR cache with {added} pages from s3://{settings.s3_bucket_ocr}/{year}/")
+
+def upload_output(uploads: UploadQueue, path: Path, year: int, folder: Path):
+    s3_key = f"{year}/{folder.name}/{path.name}"
+    print(f"⬆️ Queued {path.name} for s3://{settings.s3_bucket_ocr}/{s3_key}")
+    uploads.submit(path, s3_key)
+
+def write_document(out_folder: Path, name: str, documents, text: str, avg_conf: float, cropped: bool = False):
+    """
+    Writes the Document AI result next to the .txt in OCR_ARTIFACT_FORMAT:
+    "pb" (compressed protobuf + sidecar, see ocr_artifact.py) or "json" (the
+    indented MessageToDict dump). Returns the paths written, none with OCR_LEAN.
+    """
+    if settings.OCR_LEAN:
+        return []
+    if settings.OCR_ARTIFACT_FORMAT == "pb":
+        return write_artifact(out_folder, name, documents, text, avg_conf, cropped=cropped)
+    json_path = out_folder / f"{name}.json"
+    dicts = [MessageToDict(document._pb) for document in documents]
+    with open(json_path, "w", encoding="utf-8") as jf:
+        json.dump(dicts if cropped else dicts[0], jf, ensure_ascii=False, indent=2)
+    return [json_path]
+
+def save_page(uploads, year, output_base, folder, item, result):
+    """Writes a single page's .txt and document; returns its CSV row or None."""
+    text, avg_conf, doc = result
+    if not text:
+        return None
+    out_folder = output_base / folder.name
+    (out_folder / f"{item.stem}.txt").write_text(text, encoding="utf-8")
+    if doc:
+        for path in write_document(out_folder, item.stem, [doc], text, avg_conf):
+            upload_output(uploads, path, year, folder)
+    rel_path = out_folder / f"{item.stem}.txt"
+    return (str(rel_path.relative_to(output_base)), round(avg_conf, 4))
+
+def save_crops(uploads, year, output_base, folder, item, results):
+    """Writes a 2-column page's merged .txt and documents from its crops, in crop order; returns its CSV row or None."""
+    part_texts, part_confidences, part_docs = [], [], []
+    for text, conf, doc in results:
+        if text: part_texts.append(text)
+        if conf > 0: part_confidences.append(conf)
+        if doc: part_docs.append(doc)
+    if not part_texts:
+        return None
+    out_folder = output_base / folder.name
+    merged_text = "\n\n".join(part_texts)
+    (out_folder / f"{item.name}.txt").write_text(merged_text, encoding="utf-8")
+    avg_conf = sum(part_confidences) / len(part_confidences) if part_confidences else 0.0
+    for path in write_document(out_folder, item.name, part_docs, merged_text, avg_conf, cropped=True):
+        upload_output(uploads, path, year, folder)
+    return (f"{folder.name}/{item.name}.txt", round(avg_conf, 4))
 
 def run(year: int):
 
+    # Fail before the first billed request, not when its result is written
+    if settings.OCR_ARTIFACT_FORMAT == "pb" and not settings.OCR_LEAN:
+        require_zstandard()
+
     input_base = Path(f"temp_{year}")
     output_base = Path(f"{year}_ocr")
     csv_path = Path("ocr_confidence_summary.csv")
 
-    # os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(GCP_OCR_CRED)
-    # client = documentai.DocumentProcessorServiceClient()
-    processor_name = client.processor_path(settings.project_id, settings.location, settings.processor_id)
-
     s3 = boto3.client("s3")
+    # Outputs go to S3 from background threads; the OCR loop only waits on Document AI
+    uploads = UploadQueue(
+        s3,
+        settings.s3_bucket_ocr,
+        workers=settings.OCR_UPLOAD_WORKERS,
+        max_pending=settings.OCR_UPLOAD_QUEUE_SIZE,
+        max_retries=settings.OCR_UPLOAD_MAX_RETRIES,
+    )
 
     csv_rows = [("image_path", "average_confidence")]
 
-    def get_mime_type(file_path: Path):
-        ext = file_path.suffix.lower()
-        if ext == ".png": return "image/png"
-        elif ext in {".jpg", ".jpeg"}: return "image/jpeg"
-        else: raise ValueError(f"Unsupported file type: {ext}")
-
-    def process_image(image_path: Path):
+    # Images OCRed before (same bytes, same processor version) come from the cache
+    cache = OcrCache(settings.OCR_CACHE_PATH, settings.OCR_CACHE_MAX_MB * 1024 * 1024) if settings.OCR_CACHE_PATH else None
+    if cache and settings.OCR_CACHE_HYDRATE:
         try:
-            with open(image_path, "rb") as f:
-                content = f.read()
-            mime_type = get_mime_type(image_path)
-            raw_document = documentai.RawDocument(content=content, mime_type=mime_type)
-            response = client.process_document(request={"name": processor_name, "raw_document": raw_document})
-            document = response.document
-            text = document.text or ""
-            confidences = [token.layout.confidence for page in document.pages for token in page.tokens]
-            avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
-            return text, avg_conf, document
+            hydrate_cache(cache, s3, year, input_base)
         except Exception as e:
-            print(f"❌ Failed to process {image_path}: {e}")
-            return "", 0.0, None
-
-    for folder in sorted(input_base.iterdir()):
-        if not folder.is_dir(): continue
-
-        out_folder = output_base / folder.name
-        out_folder.mkdir(parents=True, exist_ok=True)
-
-        for item in sorted(folder.iterdir()):
-            if item.is_file() and item.suffix.lower() in [".png", ".jpg", ".jpeg"]:
-                text, avg_conf, doc = process_image(item)
-                if text:
-                    (out_folder / f"{item.stem}.txt").write_text(text, encoding="utf-8")
-                    if doc:
-                        json_path = out_folder / f"{item.stem}.json"
-                        with open(json_path, "w", encoding="utf-8") as jf:
-                            json.dump(MessageToDict(doc._pb), jf, ensure_ascii=False, indent=2)
-                        # Upload JSON to S3
-                        s3_key = f"{year}/{folder.name}/{json_path.name}"
-                        print(f"⬆️ Uploading JSON to s3://{settings.s3_bucket_ocr}/{s3_key}")
-                        s3.upload_file(str(json_path), settings.s3_bucket_ocr, s3_key)
-                    rel_path = out_folder / f"{item.stem}.txt"
-                    csv_rows.append((str(rel_path.relative_to(output_base)), round(avg_conf, 4)))
-
-            elif item.is_dir():
-                part_texts, part_confidences, part_docs = [], [], []
-                for part in sorted(item.glob("*.[pj][pn]g")):
-                    text, conf, doc = process_image(part)
-                    if text: part_texts.append(text)
-                    if conf > 0: part_confidences.append(conf)
-                    if doc: part_docs.append(doc)
-                if part_texts:
-                    merged_text = "\n\n".join(part_texts)
-                    (out_folder / f"{item.name}.txt").write_text(merged_text, encoding="utf-8")
-                    merged_json_path = out_folder / f"{item.name}.json"
-                    with open(merged_json_path, "w", encoding="utf-8") as jf:
-                        json.dump([MessageToDict(d._pb) for d in part_docs], jf, ensure_ascii=False, indent=2)
-                    # Upload JSON to S3
-                    s3_key = f"{year}/{folder.name}/{merged_json_path.name}"
-                    print(f"⬆️ Uploading JSON to s3://{settings.s3_bucket_ocr}/{s3_key}")
-                    s3.upload_file(str(merged_json_path), settings.s3_bucket_ocr, s3_key)
-                    avg_conf = sum(part_confidences) / len(part_confidences) if part_confidences else 0.0
-                    csv_rows.append((f"{folder.name}/{item.name}.txt", round(avg_conf, 4)))
+            print(f"⚠️ Could not hydrate OCR cache from s3://{settings.s3_bucket_ocr}/{year}/: {e}")
+
+    # Images and crops are OCRed by OCR_WORKERS threads under the shared rate
+    # limit; outputs are written from a bounded window in page and crop order.
+    window = deque()
+
+    def finish_oldest():
+        folder, item, get_results = window.popleft()
+        results = get_results()
+        if item.is_dir():
+            row = save_crops(uploads, year, output_base, folder, item, results)
+        else:
+            row = save_page(uploads, year, output_base, folder, item, results[0])
+        if row:
+            csv_rows.append(row)
+
+    with ThreadPoolExecutor(max_workers=settings.OCR_WORKERS) as executor:
+        for folder in sorted(input_base.iterdir()):
+            if not folder.is_dir(): continue
+
+            (output_base / folder.name).mkdir(parents=True, exist_ok=True)
+            items = list(list_items(folder))
+            for (item, _), get_results in zip(items, submit_folder(executor, items, cache)):
+                window.append((folder, item, get_results))
+            while len(window) >= 2 * settings.OCR_WORKERS:
+                finish_oldest()
+        while window:
+            finish_oldest()
+
+    succeeded, failed = uploads.close()
+    print(f"⬆️ Uploaded {succeeded} OCR outputs to s3://{settings.s3_bucket_ocr}/{year}/, {failed} failed")
+
+    if cache:
+        print(f"🗃️ OCR cache: {cache.hits} hits, {cache.misses} images sent to Document AI")
+        cache.close()
 
     with open(csv_path, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
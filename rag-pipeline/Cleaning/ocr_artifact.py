@@ -0,0 +1,152 @@
+"""
+Compact OCR artifacts: the Document AI result as serialized protobuf,
+zstd-compressed, next to a small JSON sidecar with the text and confidence.
+
+    1.docai.zst    length-delimited Document protos (one per page, or one per crop)
+    1.meta.json    {"format", "text", "confidence", "documents", "cropped"}
+
+Readers that only need the text open the sidecar; the protos are decoded on
+first access. The old indented JSON is still available on demand:
+
+    python Cleaning/ocr_artifact.py 1999_ocr/doc1/1.docai.zst [1.json]
+"""
+import json
+import argparse
+from functools import cached_property
+from pathlib import Path
+from typing import List
+from google.cloud import documentai_v1 as documentai
+from google.protobuf.json_format import MessageToDict
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for OCR_ARTIFACT_FORMAT=pb
+    zstandard = None
+
+FORMAT = "docai-pb-zst/1"
+SUFFIX = ".docai.zst"
+SIDECAR_SUFFIX = ".meta.json"
+
+
+def require_zstandard():
+    if zstandard is None:
+        raise ImportError("zstandard is not installed (pip install zstandard)")
+
+def encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def decode_varint(data: bytes, pos: int):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+def pack_documents(documents) -> bytes:
+    """Length-delimited serialized Documents, zstd-compressed."""
+    require_zstandard()
+    raw = bytearray()
+    for document in documents:
+        data = documentai.Document.serialize(document)
+        raw += encode_varint(len(data)) + data
+    return zstandard.ZstdCompressor(level=10).compress(bytes(raw))
+
+def unpack_documents(blob: bytes) -> list:
+    require_zstandard()
+    raw = zstandard.ZstdDecompressor().decompress(blob)
+    documents, pos = [], 0
+    while pos < len(raw):
+        size, pos = decode_varint(raw, pos)
+        documents.append(documentai.Document.deserialize(raw[pos:pos + size]))
+        pos += size
+    return documents
+
+
+def write_artifact(out_folder: Path, name: str, documents, text: str, confidence: float,
+                   cropped: bool = False) -> List[Path]:
+    """Writes `name`.docai.zst and its sidecar; returns both paths. `cropped` marks a 2-column page's crop list."""
+    artifact_path = out_folder / f"{name}{SUFFIX}"
+    sidecar_path = out_folder / f"{name}{SIDECAR_SUFFIX}"
+    artifact_path.write_bytes(pack_documents(documents))
+    sidecar = {
+        "format": FORMAT,
+        "text": text,
+        "confidence": round(confidence, 4),
+        "documents": len(documents),
+        "cropped": cropped,
+    }
+    sidecar_path.write_text(json.dumps(sidecar, ensure_ascii=False), encoding="utf-8")
+    return [artifact_path, sidecar_path]
+
+
+class OcrArtifact:
+    """
+    Lazy reader for an artifact written by write_artifact.
+
+    Attributes:
+    - path : Path
+        The .docai.zst file.
+    - text, confidence
+        From the sidecar, without touching the protos.
+    - documents : list
+        The decoded Documents, on first access.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @property
+    def name(self) -> str:
+        return self.path.name[:-len(SUFFIX)]
+
+    @property
+    def sidecar_path(self) -> Path:
+        return self.path.with_name(self.name + SIDECAR_SUFFIX)
+
+    @cached_property
+    def meta(self) -> dict:
+        return json.loads(self.sidecar_path.read_text(encoding="utf-8"))
+
+    @property
+    def text(self) -> str:
+        return self.meta["text"]
+
+    @property
+    def confidence(self) -> float:
+        return self.meta["confidence"]
+
+    @cached_property
+    def documents(self) -> list:
+        return unpack_documents(self.path.read_bytes())
+
+    def to_json(self):
+        """The legacy JSON: one MessageToDict for a page, a list of them for a cropped page."""
+        dicts = [MessageToDict(documentai.Document.pb(document)) for document in self.documents]
+        return dicts if self.meta["cropped"] else dicts[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an OCR artifact as the legacy indented JSON")
+    parser.add_argument("artifact", type=Path)
+    parser.add_argument("output", type=Path, nargs="?", help="Default: next to the artifact, as <name>.json")
+    args = parser.parse_args()
+
+    artifact = OcrArtifact(args.artifact)
+    output = args.output or args.artifact.with_name(f"{artifact.name}.json")
+    with open(output, "w", encoding="utf-8") as jf:
+        json.dump(artifact.to_json(), jf, ensure_ascii=False, indent=2)
+    print(f"✅ Exported {args.artifact} to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from io import BytesIO
+from pathlib import Path
+from typing import List
+from PIL import Image
+from google.cloud import documentai_v1 as documentai
+
+
+def jpeg_pdf(jpegs: List[bytes]) -> bytes:
+    """
+    A PDF with one JPEG per page, embedded as-is (DCTDecode), so packing pages
+    into one request costs no re-encoding. Page size follows the image DPI
+    (200 when the file has none).
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None]
+    page_ids = []
+    for data in jpegs:
+        with Image.open(BytesIO(data)) as img:
+            if img.mode not in ("L", "RGB"):
+                raise ValueError(f"cannot embed a {img.mode} JPEG")
+            width, height = img.size
+            color_space = "/DeviceGray" if img.mode == "L" else "/DeviceRGB"
+            dpi = (img.info.get("dpi") or (200, 200))[0] or 200
+        points_w, points_h = width * 72 / dpi, height * 72 / dpi
+
+        image_id = len(objects) + 1
+        objects.append(
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode /Length {len(data)} >>\nstream\n".encode()
+            + data + b"\nendstream"
+        )
+        content = f"q {points_w:.2f} 0 0 {points_h:.2f} 0 0 cm /Im0 Do Q".encode()
+        content_id = len(objects) + 1
+        objects.append(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+        page_ids.append(len(objects) + 1)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {points_w:.2f} {points_h:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        )
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+def multipage_tiff(images: List[bytes]) -> bytes:
+    """A lossless multi-page TIFF, for batches that are not all JPEG (e.g. bilevel PNG pages)."""
+    frames = []
+    for data in images:
+        with Image.open(BytesIO(data)) as img:
+            img.load()
+            frames.append(img if img.mode in ("1", "L", "RGB") else img.convert("RGB"))
+    out = BytesIO()
+    frames[0].save(out, format="TIFF", save_all=True, append_images=frames[1:], compression="tiff_deflate")
+    return out.getvalue()
+
+def pack_images(image_paths: List[Path]):
+    """Returns (content, mime_type) of one multi-page document holding the images in order."""
+    images = [path.read_bytes() for path in image_paths]
+    if all(path.suffix.lower() in (".jpg", ".jpeg") for path in image_paths):
+        try:
+            return jpeg_pdf(images), "application/pdf"
+        except ValueError:
+            pass
+    return multipage_tiff(images), "image/tiff"
+
+
+def shift_anchors(layout, offset: int):
+    for segment in layout.text_anchor.text_segments:
+        segment.start_index -= offset
+        segment.end_index -= offset
+
+def split_document(document) -> list:
+    """
+    Splits a multi-page Document AI result into one single-page Document per
+    page: the page's slice of `text`, and the page with its text anchors
+    re-based onto that slice, as if the page had been sent on its own.
+    """
+    full = documentai.Document.pb(document)
+    parts = []
+    for page in full.pages:
+        segments = page.layout.text_anchor.text_segments
+        start = min((s.start_index for s in segments), default=0)
+        end = max((s.end_index for s in segments), default=0)
+
+        part = type(full)(text=full.text[start:end], mime_type=full.mime_type)
+        new_page = part.pages.add()
+        new_page.CopyFrom(page)
+        new_page.page_number = 1
+        shift_anchors(new_page.layout, start)
+        for element in (*new_page.blocks, *new_page.paragraphs, *new_page.lines,
+                        *new_page.tokens, *new_page.symbols, *new_page.visual_elements):
+            shift_anchors(element.layout, start)
+        parts.append(documentai.Document.wrap(part))
+    return parts
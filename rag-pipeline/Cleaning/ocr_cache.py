@@ -0,0 +1,90 @@
+import time
+import zlib
+import sqlite3
+import threading
+
+
+class OcrCache:
+    """
+    On-disk cache of Document AI results, keyed by the image's content hash.
+
+    Rows are keyed by (sha256 of the image bytes, version), where the version
+    names the processor and processor version, and hold the serialized
+    Document (zlib-compressed) with its average token confidence. When the
+    stored payloads grow past `max_bytes`, the least recently used rows are
+    evicted down to 90% of it.
+
+    Attributes:
+    - hits, misses : int
+        Lookups answered and not answered by the cache since it was opened.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " digest TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " payload BLOB NOT NULL,"
+            " confidence REAL NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " used_at REAL NOT NULL,"
+            " PRIMARY KEY (digest, version))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def get(self, digest, version):
+        """Returns (serialized document, average confidence) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, confidence FROM results WHERE digest = ? AND version = ?", (digest, version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE results SET used_at = ? WHERE digest = ? AND version = ?", (time.time(), digest, version)
+            )
+            self._conn.commit()
+        return zlib.decompress(row[0]), row[1]
+
+    def has(self, digest, version):
+        """Membership test that leaves the hit/miss counters and recency alone."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM results WHERE digest = ? AND version = ?", (digest, version)
+            ).fetchone() is not None
+
+    def put(self, digest, version, document_bytes, confidence):
+        payload = zlib.compress(document_bytes, 6)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM results WHERE digest = ? AND version = ?", (digest, version)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, version, payload, confidence, len(payload), time.time()),
+            )
+            self._size += len(payload) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self._conn.commit()
+
+    def _evict(self, target):
+        rows = self._conn.execute("SELECT digest, version, size FROM results ORDER BY used_at").fetchall()
+        for digest, version, size in rows:
+            if self._size <= target:
+                break
+            self._conn.execute("DELETE FROM results WHERE digest = ? AND version = ?", (digest, version))
+            self._size -= size
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,43 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: on average `rate` acquisitions per second, with
+    bursts of up to `capacity` after an idle period.
+
+    Attributes:
+    - rate : float
+        Tokens added per second.
+    - capacity : float
+        Most tokens the bucket holds.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        """Blocks until `tokens` are available and takes them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def per_minute(requests_per_minute, burst=None):
+    """A bucket for a per-minute quota, e.g. Document AI's online processing requests."""
+    if requests_per_minute <= 0:
+        raise ValueError(f"requests_per_minute must be positive, got {requests_per_minute}")
+    rate = requests_per_minute / 60.0
+    return TokenBucket(rate, capacity=burst if burst is not None else max(1.0, rate))
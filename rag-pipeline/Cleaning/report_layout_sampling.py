@@ -0,0 +1,99 @@
+"""
+Accuracy/cost report for layout inheritance sampling (LAYOUT_SAMPLE_PAGES).
+
+Runs layout detection over a labeled fixture set once per page and once per
+--samples value, without touching the files, and reports for each mode how
+many pages went to the detector and how many 1/2-column decisions match the
+labels. The fixture folder holds one sub-folder of page images per document
+and a labels.csv with document,page,columns rows (columns is 1 or 2). Without
+--fixtures a synthetic set is generated: mostly 1-column rulings, a few fully
+2-column ones and a few with a single 2-column page.
+
+    LAYOUT_ENDPOINT_URL=http://127.0.0.1:8085 python Cleaning/report_layout_sampling.py --samples 1 2 3
+    python Cleaning/report_layout_sampling.py --fixtures layout_fixtures --cost-per-page 0.0004
+"""
+import csv
+import argparse
+import tempfile
+from pathlib import Path
+
+from layout_detection import get_detector, detect_pages, detect_document, list_documents
+from check_layout_scaling import fixture_page
+from utilities import settings
+
+
+class CountingDetector:
+    """Wraps a detector and counts the pages and calls that reach it."""
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.batch_size = detector.batch_size
+        self.version = detector.version
+        self.pages = 0
+        self.calls = 0
+
+    def predict(self, images):
+        self.pages += len(images)
+        self.calls += 1
+        return self.detector.predict(images)
+
+
+def make_fixtures(folder: Path):
+    """Writes a synthetic labeled set and returns the labels."""
+    layouts = [[1] * 6] * 14 + [[2] * 5] * 3 + [[1, 1, 2, 1, 1, 1, 1]] * 2 + [[1] * 3] * 5
+    labels = {}
+    for d, columns in enumerate(layouts, 1):
+        doc = folder / f"doc{d:02d}"
+        doc.mkdir(parents=True)
+        for page, column_count in enumerate(columns, 1):
+            fixture_page(doc / f"{page}.jpg", column_count == 2)
+            labels[(doc.name, page)] = column_count
+    return labels
+
+def load_labels(folder: Path):
+    with open(folder / "labels.csv", newline="", encoding="utf-8") as f:
+        return {(row["document"], int(row["page"])): int(row["columns"]) for row in csv.DictReader(f)}
+
+def evaluate(documents, labels, sample_size):
+    """Returns (pages sent to the detector, detector calls, correct pages, 2-column pages missed)."""
+    detector = CountingDetector(get_detector(settings.LAYOUT_BACKEND))
+    correct = missed = 0
+    for image_paths in documents:
+        if sample_size:
+            results = detect_document(image_paths, detector, sample_size=sample_size)
+        else:
+            results = detect_pages(image_paths, detector)
+        for image_path, (_, _, is_two_column) in zip(image_paths, results):
+            expected = labels[(image_path.parent.name, int(image_path.stem))]
+            correct += (2 if is_two_column else 1) == expected
+            missed += expected == 2 and not is_two_column
+    return detector.pages, detector.calls, correct, missed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", type=Path, help="Labeled fixture folder (default: synthetic set)")
+    parser.add_argument("--samples", nargs="+", type=int, default=[1, 2, 3], help="LAYOUT_SAMPLE_PAGES values")
+    parser.add_argument("--cost-per-page", type=float, default=0.0, help="Detector cost per page, for the estimate")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        folder = args.fixtures or Path(work_dir)
+        labels = load_labels(folder) if args.fixtures else make_fixtures(folder)
+        documents = list(list_documents(folder))
+        total = sum(len(image_paths) for image_paths in documents)
+
+        rows = []
+        for sample_size in [0] + args.samples:
+            pages, calls, correct, missed = evaluate(documents, labels, sample_size)
+            rows.append((sample_size, pages, calls, correct, missed))
+
+    print(f"{len(documents)} documents, {total} pages, "
+          f"{sum(1 for v in labels.values() if v == 2)} labeled 2-column")
+    print(f"{'mode':<10}{'pages sent':>11}{'calls':>7}{'skipped':>9}{'accuracy':>10}{'2-col missed':>14}{'cost':>10}")
+    for sample_size, pages, calls, correct, missed in rows:
+        mode = f"sample {sample_size}" if sample_size else "per page"
+        print(f"{mode:<10}{pages:>11}{calls:>7}{1 - pages / total:>9.0%}{correct / total:>10.1%}"
+              f"{missed:>14}{pages * args.cost_per_page:>10.4f}")
+
+if __name__ == "__main__":
+    main()
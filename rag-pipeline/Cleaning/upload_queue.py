@@ -0,0 +1,54 @@
+import time
+import threading
+from utilities.concurrency import BoundedExecutor, backoff_delay
+
+
+class UploadQueue:
+    """
+    Bounded background queue of file uploads to one S3 bucket.
+
+    `submit` hands a local file to a pool of upload threads and returns at
+    once, unless `max_pending` files are already queued or in flight, so the
+    caller only waits on S3 when it is far ahead of it. Failed uploads are
+    retried with full-jitter backoff; `close` waits for everything queued.
+
+    Attributes:
+    - succeeded, failed : int
+        Uploads finished so far, after retries.
+    - failures : list
+        (key, error) of the uploads that failed.
+    """
+
+    def __init__(self, s3, bucket, workers=4, max_pending=32, max_retries=3):
+        self.s3 = s3
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.succeeded = 0
+        self.failed = 0
+        self.failures = []
+        self._lock = threading.Lock()
+        self._executor = BoundedExecutor(workers, max_pending, thread_name_prefix="ocr-upload")
+
+    def submit(self, path, key):
+        return self._executor.submit(self._upload, str(path), key)
+
+    def _upload(self, path, key):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.s3.upload_file(path, self.bucket, key)
+                with self._lock:
+                    self.succeeded += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"❌ Failed to upload s3://{self.bucket}/{key}: {e}")
+                    with self._lock:
+                        self.failed += 1
+                        self.failures.append((key, e))
+                    return
+                time.sleep(backoff_delay(attempt, base=1.0))
+
+    def close(self):
+        """Waits for every queued upload; returns (succeeded, failed)."""
+        self._executor.shutdown(wait=True)
+        return self.succeeded, self.failed
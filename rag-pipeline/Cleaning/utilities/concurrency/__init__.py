@@ -0,0 +1 @@
+from .main import BoundedExecutor, backoff_delay
@@ -0,0 +1,42 @@
+"""
+Thread helpers shared by the Cleaning stages: layout_detection and ocr retry
+with backoff_delay, upload_queue.UploadQueue runs on BoundedExecutor.
+"""
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def backoff_delay(attempt, retry_after=None, base=0.5, cap=30.0):
+    """Full-jitter exponential backoff; a server Retry-After (seconds) wins when given."""
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class BoundedExecutor:
+    """
+    A thread pool whose `submit` blocks once `max_pending` tasks are queued or
+    running, so a fast producer cannot pile up work (and its payloads) in
+    memory while the workers catch up.
+    """
+
+    def __init__(self, workers, max_pending, thread_name_prefix=""):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix)
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, fn, *args, **kwargs):
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -34,6 +34,38 @@ class Settings(BaseSettings):
     AWS_REGION: str
     EXPECTED_DIM: int = 3072
     LAYOUT_ENDPOINT_NAME: str
+    LAYOUT_ENDPOINT_URL: str = ""  # e.g. http://127.0.0.1:8085 for layout_stub.py
+    LAYOUT_PAYLOAD: str = "json"  # "json" (base64) or "x-image" (raw file bytes, threshold in CustomAttributes)
+    LAYOUT_CONCURRENCY: int = 8  # endpoint invocations in flight, 1 = serial
+    LAYOUT_MAX_RETRIES: int = 5
+    LAYOUT_ENDPOINT_BATCH: int = 1  # pages per endpoint request; above 1 sends base64 JSON batches
+    LAYOUT_BATCH_MAX_BYTES: int = 4 * 1024 * 1024  # request payload cap (serverless endpoints take 4 MB)
+    LAYOUT_MAX_WIDTH: int = 0  # send pages downscaled to this width, 0 = full resolution
+    LAYOUT_MODEL_VERSION: str = "1"  # bump when the model behind the endpoint changes
+    LAYOUT_CACHE_PATH: str = "layout_cache.sqlite"  # "" disables the prediction cache
+    LAYOUT_CACHE_S3_URI: str = ""  # e.g. s3://bucket/layout_cache.sqlite to share the cache
+    LAYOUT_BACKEND: str = "endpoint"  # "endpoint" (SageMaker) or "onnx" (local CPU)
+    LAYOUT_ONNX_MODEL: str = "layout_model.onnx"
+    LAYOUT_ONNX_WIDTH: int = 800  # input size for models exported with dynamic shapes
+    LAYOUT_ONNX_HEIGHT: int = 1131
+    LAYOUT_ONNX_THREADS: int = 0  # onnxruntime intra-op threads, 0 = all cores
+    LAYOUT_BATCH_SIZE: int = 4  # pages per ONNX forward pass
+    LAYOUT_SAMPLE_PAGES: int = 0  # detect this many pages per document first, 0 = every page
+    OCR_WORKERS: int = 8  # Document AI requests in flight
+    OCR_REQUESTS_PER_MINUTE: int = 120  # processor quota for online processing requests, must be > 0
+    OCR_MAX_RETRIES: int = 5  # on RESOURCE_EXHAUSTED / DEADLINE_EXCEEDED / UNAVAILABLE
+    OCR_BATCH_PAGES: int = 0  # images per multi-page request (online OCR takes up to 15), 0 = one per image
+    OCR_BATCH_MAX_BYTES: int = 20 * 1024 * 1024
+    OCR_PROCESSOR_VERSION: str = ""  # pin a processor version, "" = the processor's default
+    OCR_CACHE_PATH: str = "ocr_cache.sqlite"  # "" disables the OCR result cache
+    OCR_CACHE_MAX_MB: int = 2048  # least recently used results are evicted past this
+    OCR_CACHE_HYDRATE: bool = False  # seed the cache from the results already in s3_bucket_ocr
+    OCR_ARTIFACT_FORMAT: str = "pb"  # "pb" (zstd protobuf + .meta.json sidecar) or "json" (indented MessageToDict)
+    OCR_FIELD_MASK: str = ""  # Document fields to request, e.g. "text,pages.tokens" (document or pages.<field> paths), "" = all
+    OCR_LEAN: bool = False  # .txt and confidence only: request LEAN_FIELD_MASK and write no document artifact
+    OCR_UPLOAD_WORKERS: int = 4  # background S3 upload threads for OCR outputs
+    OCR_UPLOAD_QUEUE_SIZE: int = 32  # files queued or in flight before the OCR loop waits
+    OCR_UPLOAD_MAX_RETRIES: int = 3
 
     PROJECT_ID: str
     TYPE: str
@@ -12,12 +12,21 @@ def run(year: int):
 
     input_root = f"temp_{year}"
     output_root = f"{year}_semantic_chunking_titan"
-    metadata_path = f"./enriched_rulings/rulings_{year}.json"
+    metadata_path = f"./enriched_rulings/rulings_{year}.jsonl"
+    if not os.path.exists(metadata_path):
+        metadata_path = f"./enriched_rulings/rulings_{year}.json"
 
     bedrock = boto3.client("bedrock-runtime", region_name=settings.REGION_NAME)
 
-    with open(metadata_path, 'r', encoding='utf-8') as f:
-        metadata_list = json.load(f)
+    def load_metadata(path):
+        """Yields entries from the streamed JSONL output (or a legacy JSON array)."""
+        with open(path, 'r', encoding='utf-8') as f:
+            if not path.endswith(".jsonl"):
+                yield from json.load(f)
+                return
+            for line in f:
+                if line.endswith("\n") and line.strip():
+                    yield json.loads(line)
 
     def extract_id(entry):
         match = re.search(r'ID=(\d+)', entry.get("link", ""))
@@ -28,9 +37,11 @@ def run(year: int):
             return match.group(1)
         return None
 
-    metadata_dict = {
-        extract_id(entry): entry for entry in metadata_list if extract_id(entry) is not None
-    }
+    metadata_dict = {}
+    for entry in load_metadata(metadata_path):
+        doc_id = extract_id(entry)
+        if doc_id is not None:
+            metadata_dict[doc_id] = entry
 
     def split_into_sentences(text: str) -> List[str]:
         return [s.strip() for s in re.split(r'(?<=[.؟!])\s+', text) if s.strip()]
@@ -0,0 +1,159 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from utilities import settings
+from utilities.concurrency import backoff_delay  # re-exported for the fetch loops
+
+
+OK = "ok"              # healthy response, may grow the limit
+OVERLOAD = "overload"  # 429 / 5xx / timeout, shrink the limit and retry
+ERROR = "error"        # anything else (404, bad URL...), neither grows nor shrinks
+
+
+def classify_status(status):
+    if status in (200, 206, 304):
+        return OK
+    if status == 429 or status >= 500:
+        return OVERLOAD
+    return ERROR
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one remote host, usable from threads and from asyncio.
+
+    The limit grows by roughly one slot per window of healthy responses while
+    latency stays within `latency_tolerance` times the best latency seen and at
+    most `max_error_rate` of the last `error_window` requests failed, and is
+    multiplied by `decrease` on 429/5xx/timeouts. Decreases are applied at most
+    once per `cooldown` seconds so one burst of failures counts as one signal.
+    Async waiters are woken on release, from any thread or event loop.
+
+    Attributes:
+    - limit : float
+        The current number of requests allowed in flight.
+    - in_flight : int
+        The number of requests currently holding a slot.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=64, decrease=0.5, latency_tolerance=2.0, cooldown=1.0,
+                 error_window=50, max_error_rate=0.05):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.max_error_rate = max_error_rate
+        self.in_flight = 0
+        self.best_latency = None
+        self._last_decrease = 0.0
+        self._recent = deque(maxlen=error_window)  # True for each recent request that failed
+        self._cond = threading.Condition()
+        self._async_waiters = []
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await waiter[1]
+            finally:
+                with self._cond:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def release(self, outcome, latency=None):
+        with self._cond:
+            self.in_flight -= 1
+            self._recent.append(outcome != OK)
+            if outcome == OK:
+                self._on_success(latency)
+            elif outcome == OVERLOAD:
+                self._on_overload()
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:  # the waiter's loop is closed
+                pass
+
+    def _on_success(self, latency):
+        if sum(self._recent) > self.max_error_rate * len(self._recent):
+            return
+        if latency is not None:
+            if self.best_latency is None or latency < self.best_latency:
+                self.best_latency = latency
+            if latency > self.best_latency * self.latency_tolerance:
+                return
+        self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def _on_overload(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease)
+
+    @contextmanager
+    def slot(self):
+        """Holds a slot for one request; set "outcome" (and optionally "latency") on the yielded dict."""
+        self.acquire()
+        result = {"outcome": ERROR}
+        start = time.monotonic()
+        try:
+            yield result
+        finally:
+            self.release(result["outcome"], result.get("latency", time.monotonic() - start))
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """Async twin of `slot`."""
+        await self.acquire_async()
+        result = {"outcome": ERROR}
+        start = time.monotonic()
+        try:
+            yield result
+        finally:
+            self.release(result["outcome"], result.get("latency", time.monotonic() - start))
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(host):
+    """One shared limiter per remote host, so every stage in the process backs off together."""
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter(
+                initial=settings.ADAPTIVE_INITIAL,
+                minimum=settings.ADAPTIVE_MIN,
+                maximum=settings.ADAPTIVE_MAX,
+            )
+        return _limiters[host]
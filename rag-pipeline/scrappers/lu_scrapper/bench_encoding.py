@@ -0,0 +1,112 @@
+"""
+Compare page image encoding profiles on sample PDFs.
+
+For every profile the script renders the sample pages at the profile's DPI,
+encodes them, and reports bytes per page, render and encode time per page.
+With --ocr it also sends each encoded page to Document AI through the
+Cleaning stage's ocr.process_image and reports the average token confidence,
+the same figure recorded in ocr_confidence_summary.csv.
+
+    python scrappers/lu_scrapper/bench_encoding.py samples/*.pdf --pages 5 --ocr
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+from encoding_profiles import PROFILES, encode_page
+
+CLEANING_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "..", "Cleaning"))
+
+# Runs in CLEANING_DIR, so `import ocr` picks up the Cleaning settings (its
+# Document AI and OCR_* fields), not the scraper's `utilities` package
+OCR_SCRIPT = """
+import sys, json
+from pathlib import Path
+import ocr
+confidences = [ocr.process_image(Path(path))[1] for path in sys.argv[2:]]
+Path(sys.argv[1]).write_text(json.dumps(confidences))
+"""
+
+
+def ocr_confidences(paths, work_dir):
+    """Average token confidence per image, from the Cleaning stage's ocr.process_image in a child process."""
+    if not paths:
+        return []
+    results = Path(work_dir) / "confidences.json"
+    subprocess.run([sys.executable, "-c", OCR_SCRIPT, str(results), *map(str, paths)], cwd=CLEANING_DIR, check=True)
+    return json.loads(results.read_text())
+
+def bench_profile(profile, pdfs, max_pages, work_dir, ocr=False):
+    sizes, render_times, encode_times, encoded = [], [], [], []
+    for pdf in pdfs:
+        pages = min(max_pages, int(pdfinfo_from_path(pdf)["Pages"]))
+        start = time.perf_counter()
+        paths = convert_from_path(pdf, dpi=profile.dpi, last_page=pages,
+                                  output_folder=work_dir, fmt="ppm", paths_only=True)
+        render_times.append((time.perf_counter() - start) / max(1, len(paths)))
+
+        for i, path in enumerate(sorted(paths), 1):
+            with Image.open(path) as image:
+                start = time.perf_counter()
+                data = encode_page(image, profile)
+                encode_times.append(time.perf_counter() - start)
+            os.remove(path)
+            sizes.append(len(data))
+
+            if ocr:
+                out = Path(work_dir) / f"{Path(pdf).stem}_{i}.{profile.extension}"
+                out.write_bytes(data)
+                encoded.append(out)
+
+    confidences = ocr_confidences(encoded, work_dir)
+    for out in encoded:
+        out.unlink()
+
+    avg = lambda xs: sum(xs) / len(xs) if xs else 0.0
+    return {
+        "profile": profile.name,
+        "pages": len(sizes),
+        "bytes_per_page": round(avg(sizes)),
+        "render_ms": round(avg(render_times) * 1000, 1),
+        "encode_ms": round(avg(encode_times) * 1000, 1),
+        "average_confidence": round(avg(confidences), 4) if ocr else "",
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdfs", nargs="+", help="Sample PDFs")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--pages", type=int, default=5, help="Pages per PDF")
+    parser.add_argument("--ocr", action="store_true", help="Also measure Document AI confidence")
+    parser.add_argument("--out", default="encoding_benchmark.csv")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name in args.profiles:
+            rows.append(bench_profile(PROFILES[name], args.pdfs, args.pages, work_dir, args.ocr))
+
+    print(f"{'profile':<14}{'pages':>6}{'KB/page':>10}{'render ms':>11}{'encode ms':>11}{'confidence':>12}")
+    for r in rows:
+        print(f"{r['profile']:<14}{r['pages']:>6}{r['bytes_per_page'] / 1024:>10.1f}"
+              f"{r['render_ms']:>11}{r['encode_ms']:>11}{str(r['average_confidence']):>12}")
+
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"💾 Saved {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Parity check and parse-throughput benchmark for the HTML extraction backends.
+
+Every backend must return exactly what the bs4 reference returns for each
+fixture page; the script exits non-zero on the first mismatch. Fixtures are
+real pages saved from the court website into a folder (listing_*.html /
+detail_*.html, at least one of each, or the script fails), plus edge cases
+and synthetic pages built with the same markup as the bench_scrape stand-in
+server. Known divergences on malformed markup are printed, not failed on.
+
+    curl -s "$BASE_URL" -o saved_pages/listing_1.html
+    python scrappers/lu_scrapper/bench_extraction.py --fixtures saved_pages/ --rounds 5
+"""
+import os
+import sys
+import time
+import glob
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extraction import BACKENDS, get_backend
+from sample_pages import listing_html, detail_html
+
+BASE_URL = "https://example.com"
+
+EDGE_CASE_LISTINGS = [
+    "",
+    "<html><body><p>no results</p></body></html>",
+    '<div id="MainContent_mainLegTr"></div>',
+    '<div id="MainContent_mainLegTr"><div class="col extra-wrap">'
+    '<a href="/R.aspx?ID=1"><h4> عنوان <!-- note --> <b>الحكم</b> </h4></a>'
+    '<ul><li> أ </li><li><script>var x;</script>ب</li></ul></div>'
+    '<div class="extra-wrap"><h4>بدون رابط</h4></div></div>'
+    '<ul><li class="active disabled"><a href="?p=2"><i class="fa fa-step-backward"></i></a></li></ul>',
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<html><body><div id="MainContent_mainLegTr"><div class="extra-wrap">'
+    '<a href="/R.aspx?ID=2"><h4>حكم</h4></a><ul><li>تصنيف</li></ul></div></div>'
+    '<ul><li><a href="?p=3"><i class="fa fa-step-backward"></i></a></li></ul></body></html>',
+]
+
+EDGE_CASE_DETAILS = [
+    "",
+    '<a id="MainContent_downloadPDF">no href</a>',
+    '<a id="MainContent_downloadPDF" href="/GetPDF.aspx?RuliID=7">x</a>'
+    '<div id="MainContent_RulingText"> سطر <br> آخر &amp; <style>p{}</style> </div>',
+]
+
+# Malformed markup the backends repair differently (see extraction.py)
+KNOWN_DIVERGENCES = [
+    ("unclosed <li>", "listing",
+     '<div id="MainContent_mainLegTr"><div class="extra-wrap"><a href="/R.aspx?ID=3"><h4>t</h4></a>'
+     '<ul><li>a<li>b</ul></div></div>'),
+    ("CDATA section", "detail", '<div id="MainContent_RulingText">x<![CDATA[y]]>z</div>'),
+]
+
+
+def read_pages(folder, pattern):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(folder, pattern))):
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+def load_fixtures(folder):
+    saved_listings = read_pages(folder, "listing_*.html")
+    saved_details = read_pages(folder, "detail_*.html")
+    if not saved_listings or not saved_details:
+        return None, None
+    listings = list(EDGE_CASE_LISTINGS) + [listing_html(p, 3, 10) for p in (1, 2, 3)] + saved_listings
+    details = list(EDGE_CASE_DETAILS) + [detail_html(i) for i in range(5)] + saved_details
+    return listings, details
+
+def report_divergences(name):
+    parse_listing, parse_detail = get_backend(name)
+    ref_listing, ref_detail = BACKENDS["bs4"]
+    for label, kind, html in KNOWN_DIVERGENCES:
+        parse, ref = (parse_listing, ref_listing) if kind == "listing" else (parse_detail, ref_detail)
+        ours, expected = parse(html, BASE_URL), ref(html, BASE_URL)
+        if ours != expected:
+            print(f"⚠️ {name}: {label} gives {ours}, bs4 gives {expected}")
+
+def check_parity(name, listings, details):
+    ref_listing, ref_detail = BACKENDS["bs4"]
+    parse_listing, parse_detail = get_backend(name)
+    for i, html in enumerate(listings):
+        if parse_listing(html, BASE_URL) != ref_listing(html, BASE_URL):
+            print(f"❌ {name}: listing fixture {i} differs from bs4")
+            return False
+    for i, html in enumerate(details):
+        if parse_detail(html, BASE_URL) != ref_detail(html, BASE_URL):
+            print(f"❌ {name}: detail fixture {i} differs from bs4")
+            return False
+    print(f"✅ {name}: {len(listings)} listing and {len(details)} detail fixtures match bs4")
+    return True
+
+def measure(name, listings, details, rounds):
+    parse_listing, parse_detail = get_backend(name)
+    pages = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html in listings:
+            parse_listing(html, BASE_URL)
+        for html in details:
+            parse_detail(html, BASE_URL)
+        pages += len(listings) + len(details)
+    return pages / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", required=True, help="Folder with saved listing_*.html / detail_*.html pages")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    listings, details = load_fixtures(args.fixtures)
+    if listings is None:
+        print(f"❌ No saved listing_*.html and detail_*.html pages in {args.fixtures}: parity needs real pages")
+        sys.exit(1)
+    ok = all([check_parity(name, listings, details) for name in BACKENDS if name != "bs4"])
+    for name in BACKENDS:
+        if name != "bs4":
+            report_divergences(name)
+
+    print(f"\n{'backend':<10}{'pages/s':>10}")
+    rates = {name: measure(name, listings, details, args.rounds) for name in BACKENDS}
+    for name, rate in rates.items():
+        print(f"{name:<10}{rate:>10.1f}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark the scraping engines against a local stand-in for the court website.
+
+The stand-in serves synthetic listing/detail pages with the same markup the
+parsers look for, adds a fixed per-request latency and a per-connection setup
+delay (a stand-in for TCP/TLS handshakes), and speaks HTTP/1.1 keep-alive.
+
+    python scrappers/lu_scrapper/bench_scrape.py --pages 20 --per-page 10
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scrapping
+from sample_pages import listing_html, detail_html
+from utilities import settings
+
+
+def make_handler(pages, per_page, latency, connect_delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            time.sleep(connect_delay)
+            super().setup()
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = parse_qs(parsed.query)
+            if parsed.path.endswith("AdvancedRulingSearch.aspx"):
+                page = int(query.get("pageNumber", ["1"])[0])
+                body = listing_html(page, pages, per_page)
+            else:
+                body = detail_html(int(query.get("ID", ["0"])[0]))
+            time.sleep(latency)
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def start_server(pages, per_page, latency, connect_delay):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(pages, per_page, latency, connect_delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--per-page", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per response")
+    parser.add_argument("--connect-delay", type=float, default=0.05, help="Seconds per new connection")
+    parser.add_argument("--page-delay", type=float, default=0.0, help="Override the politeness delay")
+    args = parser.parse_args()
+
+    server = start_server(args.pages, args.per_page, args.latency, args.connect_delay)
+    settings.BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    scrapping.PAGE_DELAY = args.page_delay
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        for engine in ["threads", "async"]:
+            start = time.perf_counter()
+            scrapping.run(0, engine=engine, use_cache=False, resume=False)
+            elapsed = time.perf_counter() - start
+            rows.append((engine, elapsed, args.pages / elapsed))
+    server.shutdown()
+
+    print(f"\n{'engine':<10}{'seconds':>10}{'pages/s':>10}")
+    for engine, elapsed, rate in rows:
+        print(f"{engine:<10}{elapsed:>10.2f}{rate:>10.2f}")
+    print(f"speedup: {rows[0][1] / rows[1][1]:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Peak-memory comparison of the buffered and streamed PDF transfer modes.
+
+A local HTTP server stands in for the court website and serves documents of
+growing size; a moto server in a child process stands in for S3, so only the
+client side of the transfer is traced. For each size the script reports the
+peak traced memory of one transfer. The streamed mode should stay flat at
+a few parts, the buffered mode grows with the document. The script exits
+non-zero if the streamed peak grows with the document (by more than half a
+part between the sizes of at least two parts) or exceeds --max-parts parts.
+The part being filled, its copy for upload_part and botocore's handling of
+the request body put the streamed peak at about four parts.
+
+    pip install "moto[server]"
+    python scrappers/lu_scrapper/bench_transfer.py --sizes-mb 8 32 128
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utilities.storage.s3 import upload_stream
+
+BUCKET = "bench-transfer"
+BLOCK = os.urandom(1024 * 1024)
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        size_mb = int(self.path.strip("/"))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(size_mb * len(BLOCK)))
+        self.end_headers()
+        for _ in range(size_mb):
+            self.wfile.write(BLOCK)
+
+    def log_message(self, *args):
+        pass
+
+
+def buffered(s3, url, key, part_size):
+    body = requests.get(url, timeout=60).content
+    s3.put_object(Bucket=BUCKET, Key=key, Body=body, ContentType="application/pdf")
+
+def streamed(s3, url, key, part_size):
+    # As stream_pdf_to_s3: spool the download (one part in memory, then disk), then upload in parts
+    with requests.get(url, timeout=60, stream=True) as r, tempfile.SpooledTemporaryFile(max_size=part_size) as body:
+        for chunk in r.iter_content(chunk_size=64 * 1024):
+            body.write(chunk)
+        body.seek(0)
+        chunks = iter(lambda: body.read(64 * 1024), b"")
+        upload_stream(s3, chunks, BUCKET, key, part_size, "application/pdf")
+
+def peak_mb(fn, *args):
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+def start_moto():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, "-c", f"import time; from moto.server import ThreadedMotoServer; ThreadedMotoServer(port={port}).start(); time.sleep(1e9)"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("moto server did not start")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", nargs="+", type=int, default=[8, 32, 128])
+    parser.add_argument("--part-mb", type=int, default=8)
+    parser.add_argument("--max-parts", type=float, default=5, help="Allowed streamed peak, in parts")
+    args = parser.parse_args()
+    if sum(size >= 2 * args.part_mb for size in args.sizes_mb) < 2:
+        parser.error("give at least two --sizes-mb of two parts or more to check that memory stays flat")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    part_size = args.part_mb * 1024 * 1024
+
+    streamed_peaks = []
+    moto, endpoint = start_moto()
+    try:
+        s3 = boto3.client(
+            "s3", region_name="us-east-1", endpoint_url=endpoint,
+            aws_access_key_id="testing", aws_secret_access_key="testing",
+        )
+        s3.create_bucket(Bucket=BUCKET)
+
+        print(f"{'size MB':>8}{'buffered MB':>14}{'streamed MB':>14}")
+        for size in args.sizes_mb:
+            url = f"{base}/{size}"
+            buf = peak_mb(buffered, s3, url, f"buffered/{size}.pdf", part_size)
+            stream = peak_mb(streamed, s3, url, f"streamed/{size}.pdf", part_size)
+            head = s3.head_object(Bucket=BUCKET, Key=f"streamed/{size}.pdf")
+            assert head["ContentLength"] == size * len(BLOCK)
+            print(f"{size:>8}{buf:>14.1f}{stream:>14.1f}")
+            if size >= 2 * args.part_mb:
+                streamed_peaks.append((size, stream))
+    finally:
+        moto.kill()
+        server.shutdown()
+
+    ok = True
+    peaks = [peak for _, peak in streamed_peaks]
+    if max(peaks) > args.max_parts * args.part_mb:
+        print(f"❌ Streamed peak {max(peaks):.1f} MB exceeds {args.max_parts:g} × {args.part_mb} MB parts")
+        ok = False
+    (first_size, first_peak), (last_size, last_peak) = streamed_peaks[0], streamed_peaks[-1]
+    if last_peak - first_peak > args.part_mb / 2:
+        print(f"❌ Streamed peak grew by {last_peak - first_peak:.1f} MB from {first_size} MB to {last_size} MB documents")
+        ok = False
+    if not ok:
+        sys.exit(1)
+    print("✅ Streamed transfer memory stays flat")
+
+if __name__ == "__main__":
+    main()
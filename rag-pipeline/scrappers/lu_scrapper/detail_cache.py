@@ -0,0 +1,75 @@
+import json
+import zlib
+import time
+import sqlite3
+import threading
+
+
+class DetailCache:
+    """
+    On-disk cache of ruling detail pages, keyed by URL.
+
+    Each row keeps the validators the server sent (ETag / Last-Modified) and the
+    already-extracted `{link_to_full_document, summary}` dict, zlib-compressed,
+    so a 304 answer never needs the page to be parsed again.
+
+    Attributes:
+    - trust : bool
+        When True, cached entries are returned without contacting the server at
+        all. Only meant for years that are closed and will not change.
+    """
+
+    def __init__(self, path, trust=False):
+        self.trust = trust
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS details ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " payload BLOB NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        """Returns (etag, last_modified, detail) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, payload FROM details WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, payload = row
+        return etag, last_modified, json.loads(zlib.decompress(payload).decode("utf-8"))
+
+    def put(self, url, etag, last_modified, detail):
+        payload = zlib.compress(json.dumps(detail, ensure_ascii=False).encode("utf-8"), 9)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, payload, time.time()),
+            )
+            self._conn.commit()
+
+    def touch(self, url):
+        with self._lock:
+            self._conn.execute("UPDATE details SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def conditional_headers(base_headers, cached):
+    """Adds If-None-Match / If-Modified-Since for a cached entry."""
+    headers = dict(base_headers)
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    return headers
@@ -0,0 +1,186 @@
+import threading
+from functools import lru_cache
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+
+# ==== REFERENCE BACKEND: BeautifulSoup / html.parser ====
+
+def parse_detail_bs4(html, base_url):
+    soup = BeautifulSoup(html, "html.parser")
+
+    # PDF link
+    pdf_tag = soup.find("a", id="MainContent_downloadPDF")
+    full_doc = urljoin(base_url, pdf_tag["href"]) if pdf_tag and pdf_tag.get("href") else None
+
+    # Summary
+    summary_tag = soup.find("div", id="MainContent_RulingText")
+    summary = summary_tag.get_text(strip=True) if summary_tag else None
+
+    return {"link_to_full_document": full_doc, "summary": summary}
+
+def parse_listing_bs4(html, base_url):
+    soup = BeautifulSoup(html, "html.parser")
+
+    container = soup.find("div", id="MainContent_mainLegTr")
+    if not container:
+        return None, None
+
+    blocks = container.find_all("div", class_="extra-wrap")
+    if not blocks:
+        return None, None
+
+    batch = []
+    for block in blocks:
+        a_tag = block.find("a", href=True)
+        h4 = a_tag.find("h4") if a_tag else None
+        link = urljoin(base_url, a_tag['href']) if a_tag else None
+        title = h4.get_text(strip=True) if h4 else None
+        list_items = block.find_all("li")
+        tags = [li.get_text(strip=True) for li in list_items]
+        batch.append(make_entry(link, title, tags))
+
+    # Pagination check
+    next_href = None
+    for icon in soup.find_all("i", class_="fa fa-step-backward"):
+        parent_a = icon.find_parent("a", href=True)
+        parent_li = parent_a.find_parent("li") if parent_a else None
+        if parent_a and parent_li:
+            if "disabled" in parent_li.get("class", []):
+                next_href = None
+            else:
+                next_href = parent_a['href']
+            break
+
+    return batch, next_href
+
+
+# ==== FAST BACKEND: lxml with targeted XPath ====
+# libxml2 repairs malformed markup the way browsers do, html.parser does not, so
+# the two differ on pages such as (bench_extraction.py prints both results):
+# - an unclosed <li>: lxml closes it at the next <li> (["a", "b"]), html.parser
+#   nests the next one inside it (["ab", "b"])
+# - a <![CDATA[...]]> section: lxml drops it ("xz"), html.parser keeps its text ("xyz")
+# Only switch HTML_BACKEND to lxml after bench_extraction.py passes on saved pages.
+
+SKIPPED_TEXT_TAGS = {"script", "style", "template"}
+
+def stripped_text(element):
+    """Same result as BeautifulSoup's get_text(strip=True): comments and script/style text skipped."""
+    parts = []
+
+    def walk(node):
+        if node.tag not in SKIPPED_TEXT_TAGS and node.text:
+            parts.append(node.text.strip())
+        for child in node:
+            if isinstance(child.tag, str):
+                walk(child)
+            if child.tail:
+                parts.append(child.tail.strip())
+
+    walk(element)
+    return "".join(parts)
+
+def has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+_parsers = threading.local()
+
+def parse_html_lxml(html):
+    """
+    The page's lxml tree, or None if lxml cannot parse it. Text is handed over
+    as UTF-8 bytes: lxml refuses str input that carries an <?xml encoding=...?>
+    prolog, and lxml parsers must not be shared between threads.
+    """
+    try:
+        if isinstance(html, str):
+            if not hasattr(_parsers, "utf8"):
+                _parsers.utf8 = lxml.html.HTMLParser(encoding="utf-8")
+            return lxml.html.fromstring(html.encode("utf-8"), parser=_parsers.utf8)
+        return lxml.html.fromstring(html)
+    except Exception:
+        return None
+
+def parse_detail_lxml(html, base_url):
+    root = parse_html_lxml(html)
+    if root is None:
+        return parse_detail_bs4(html, base_url)
+
+    pdf_tags = root.xpath('//a[@id="MainContent_downloadPDF"]')
+    href = pdf_tags[0].get("href") if pdf_tags else None
+    full_doc = urljoin(base_url, href) if href else None
+
+    summary_tags = root.xpath('//div[@id="MainContent_RulingText"]')
+    summary = stripped_text(summary_tags[0]) if summary_tags else None
+
+    return {"link_to_full_document": full_doc, "summary": summary}
+
+def parse_listing_lxml(html, base_url):
+    root = parse_html_lxml(html)
+    if root is None:
+        return parse_listing_bs4(html, base_url)  # 👈 never read an unparsable page as "no more results"
+
+    containers = root.xpath('//div[@id="MainContent_mainLegTr"]')
+    if not containers:
+        return None, None
+
+    blocks = containers[0].xpath(f".//div[{has_class('extra-wrap')}]")
+    if not blocks:
+        return None, None
+
+    batch = []
+    for block in blocks:
+        a_tags = block.xpath(".//a[@href]")
+        a_tag = a_tags[0] if a_tags else None
+        h4s = a_tag.xpath(".//h4") if a_tag is not None else []
+        link = urljoin(base_url, a_tag.get("href")) if a_tag is not None else None
+        title = stripped_text(h4s[0]) if h4s else None
+        tags = [stripped_text(li) for li in block.xpath(".//li")]
+        batch.append(make_entry(link, title, tags))
+
+    next_href = None
+    for icon in root.xpath('//i[@class="fa fa-step-backward"]'):
+        parent_as = icon.xpath("ancestor::a[@href][1]")
+        parent_lis = parent_as[0].xpath("ancestor::li[1]") if parent_as else []
+        if parent_as and parent_lis:
+            if "disabled" in (parent_lis[0].get("class") or "").split():
+                next_href = None
+            else:
+                next_href = parent_as[0].get("href")
+            break
+
+    return batch, next_href
+
+
+# ==== BACKEND SELECTION ====
+
+def make_entry(link, title, tags):
+    entry = {
+        "link": link,
+        "title": title,
+        "list": tags
+    }
+    if not link:
+        entry["link_to_full_document"] = None
+        entry["summary"] = None
+    return entry
+
+BACKENDS = {
+    "bs4": (parse_listing_bs4, parse_detail_bs4),
+    "lxml": (parse_listing_lxml, parse_detail_lxml),
+}
+
+@lru_cache(maxsize=None)
+def get_backend(name):
+    """Returns (parse_listing, parse_detail) for a backend, falling back to bs4 without lxml."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML backend: {name}")
+    if name == "lxml" and lxml is None:
+        print("⚠️ lxml is not installed, using the bs4 HTML backend")
+        name = "bs4"
+    return BACKENDS[name]
@@ -1,26 +1,76 @@
-import os, subprocess, argparse
+import os, sys, argparse, threading, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, "..", ".."))
 
-def run_script(label, script_name, year):
-    script_path = os.path.join(BASE_DIR, script_name)
-    print(f"➡️ Running {label} for {year}")
-    subprocess.run(
-        ["python", script_path, "--year", str(year)],
-        cwd=PROJECT_ROOT,  # 👈 runs from top level so `utilities` is visible
-        check=True
-    )
-
-def main(years):
-    for year in years:
-        run_script("scraping", "scrapping.py", year)
-        run_script("upload", "upload_to_s3.py", year)
-        run_script("transform", "transform.py", year)
+import scrapping
+import upload_to_s3
+import transform
+from rulings_io import jsonl_path, checkpoint_path, follow_rulings
+from utilities import settings
+
+
+def run_year(year, raster_pool, restart=False):
+    """
+    Scrapes one year while its PDFs are already being uploaded from the
+    rulings written so far, then rasterizes the uploaded PDFs.
+    """
+    if restart and os.path.exists(checkpoint_path(year)):
+        os.remove(checkpoint_path(year))  # so the upload side does not follow the old file
+
+    scraped = threading.Event()
+    errors = []
+
+    def scrape():
+        try:
+            scrapping.run(year, resume=not restart)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            scraped.set()
+
+    print(f"➡️ Running scraping and upload for {year}")
+    scraper = threading.Thread(target=scrape, name=f"scrape-{year}")
+    scraper.start()
+    try:
+        upload_to_s3.process_file(jsonl_path(year), year, entries=follow_rulings(year, scraped.is_set))
+    finally:
+        scraper.join()
+    if errors:
+        raise errors[0]
+
+    print(f"➡️ Running transform for {year}")
+    transform.main(year, executor=raster_pool)
+
+
+def main(years, restart=False):
+    os.chdir(PROJECT_ROOT)  # 👈 rulings files live at the top level, as with the per-script runs
+
+    # Years share the process: one rasterization pool, and one adaptive limiter
+    # per host for all scraping and PDF downloads. Workers are spawned, not
+    # forked, because the parent is full of scraping and upload threads.
+    failed = []
+    with transform.make_raster_pool(multiprocessing.get_context("spawn")) as raster_pool, \
+            ThreadPoolExecutor(max_workers=settings.YEAR_CONCURRENCY) as executor:
+        futures = {executor.submit(run_year, year, raster_pool, restart): year for year in years}
+        for future in as_completed(futures):
+            year = futures[future]
+            try:
+                future.result()
+                print(f"✅ Finished {year}")
+            except Exception as e:
+                failed.append(year)
+                print(f"❗ Failed year {year}: {e}")
+
+    if failed:
+        print(f"❌ Done, failed years: {sorted(failed)}")
+        sys.exit(1)  # 👈 so full_pipeline.py stops before Cleaning, as with check=True before
     print("✅ Done")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--years", nargs="+", type=int, required=True)
+    parser.add_argument("--restart", action="store_true", help="Scrape the years from page 1 again")
     args = parser.parse_args()
-    main(args.years)
+    main(args.years, restart=args.restart)
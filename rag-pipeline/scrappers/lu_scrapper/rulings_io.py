@@ -0,0 +1,130 @@
+import os
+import json
+import time
+
+
+def jsonl_path(year):
+    return f"rulings_{year}.jsonl"
+
+def checkpoint_path(year):
+    return f"rulings_{year}.checkpoint.json"
+
+def load_checkpoint(year):
+    path = checkpoint_path(year)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def find_rulings_file(year, folder="."):
+    """Prefers the streamed JSONL output, falls back to the legacy JSON array."""
+    for name in (jsonl_path(year), f"rulings_{year}.json"):
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class RulingsWriter:
+    """
+    Append-only JSONL writer for one scraped year, with a page checkpoint.
+
+    After every listing page the entries are appended and flushed, then the
+    checkpoint records the page URL, the next page URL and the byte offset of
+    the JSONL file. On resume the file is truncated back to that offset, so a
+    page that was half-written when the run died is written again exactly once.
+    """
+
+    def __init__(self, year, resume=True):
+        self.year = year
+        self.path = jsonl_path(year)
+        self.checkpoint = load_checkpoint(year) if resume and os.path.exists(self.path) else None
+        self.count = self.checkpoint["count"] if self.checkpoint else 0
+
+        offset = self.checkpoint["offset"] if self.checkpoint else 0
+        self._file = open(self.path, "r+b" if self.checkpoint else "wb")
+        self._file.truncate(offset)
+        self._file.seek(offset)
+
+    @property
+    def done(self):
+        return bool(self.checkpoint and self.checkpoint["next_url"] is None)
+
+    @property
+    def resume_url(self):
+        return self.checkpoint["next_url"] if self.checkpoint else None
+
+    def write_page(self, page_url, next_url, entries):
+        for entry in entries:
+            self._file.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.count += len(entries)
+
+        self.checkpoint = {
+            "page_url": page_url,
+            "next_url": next_url,
+            "offset": self._file.tell(),
+            "count": self.count,
+        }
+        tmp_path = checkpoint_path(self.year) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, checkpoint_path(self.year))
+
+    def finish(self):
+        """Marks the year complete even when the last page had no results."""
+        if not self.done:
+            self.write_page(self.checkpoint["page_url"] if self.checkpoint else None, None, [])
+
+    def close(self):
+        self._file.close()
+
+
+def iter_rulings(path):
+    """
+    Yields rulings one at a time from a JSONL file (or a legacy JSON array).
+    A trailing line without a newline is a write in progress and is skipped.
+    """
+    if not path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            if line.strip():
+                yield json.loads(line)
+
+
+def follow_rulings(year, finished, poll=1.0):
+    """
+    Yields rulings from a year's JSONL while a RulingsWriter is still appending to it.
+
+    Only bytes before the checkpoint offset are read, since those pages are
+    flushed and survive a resume. Stops once the checkpoint marks the year
+    complete, or `finished()` is true (the writer stopped) and everything
+    checkpointed has been read.
+    """
+    path = jsonl_path(year)
+    position = 0
+    while True:
+        stopped = finished()
+        checkpoint = load_checkpoint(year) if os.path.exists(path) else None
+        offset = checkpoint["offset"] if checkpoint else 0
+
+        if offset > position:
+            with open(path, "rb") as f:
+                f.seek(position)
+                data = f.read(offset - position)
+            position = offset
+            for line in data.splitlines():
+                if line.strip():
+                    yield json.loads(line)
+            continue
+
+        if stopped or (checkpoint and checkpoint["next_url"] is None):
+            return
+        time.sleep(poll)
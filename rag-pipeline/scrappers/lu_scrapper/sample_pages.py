@@ -0,0 +1,25 @@
+"""Synthetic listing/detail pages using the court website's markup, for benchmarks."""
+
+
+def listing_html(page, pages, per_page):
+    blocks = []
+    for i in range(per_page):
+        rid = page * per_page + i
+        blocks.append(
+            f'<div class="extra-wrap"><a href="/RulingDetails.aspx?ID={rid}"><h4>حكم رقم {rid}</h4></a>'
+            f'<ul><li>مدني</li><li>{page}</li></ul></div>'
+        )
+    disabled = ' class="disabled"' if page >= pages else ""
+    pager = (
+        f'<ul class="pagination"><li{disabled}><a href="/AdvancedRulingSearch.aspx?rulYear=0&pageNumber={page + 1}">'
+        f'<i class="fa fa-step-backward"></i></a></li></ul>'
+    )
+    filler = "<p>" + "نص " * 2000 + "</p>"
+    return f'<html><body>{filler}<div id="MainContent_mainLegTr">{"".join(blocks)}</div>{pager}</body></html>'
+
+def detail_html(rid):
+    filler = "<p>" + "متن " * 1500 + "</p>"
+    return (
+        f'<html><body>{filler}<a id="MainContent_downloadPDF" href="/GetPDF.aspx?RuliID={rid}">PDF</a>'
+        f'<div id="MainContent_RulingText">ملخص الحكم {rid}</div></body></html>'
+    )
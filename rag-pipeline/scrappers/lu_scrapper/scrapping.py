@@ -1,124 +1,275 @@
 import requests
-from bs4 import BeautifulSoup
-import json
 import time
+import asyncio
 import argparse
-from urllib.parse import urljoin
+from collections import deque
+from urllib.parse import urljoin, urlparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import aiohttp
+from datetime import date
+from extraction import get_backend
+from detail_cache import DetailCache, conditional_headers
+from rulings_io import RulingsWriter
+from adaptive import get_limiter, classify_status, backoff_delay, OVERLOAD
 from utilities import settings
 import sys
 import os
 
 
 
+PAGE_DELAY = 0.5  # seconds between listing page requests
+PIPELINE_DEPTH = 2  # listing pages whose details may be in flight at once
 
 
 def get_full_url(relative_url):
     return urljoin(settings.BASE_URL, relative_url)
 
-def fetch_detail(link):
-    """Fetch summary and document link from a ruling page"""
-    try:
-        res = requests.get(link, headers=settings.HEADERS, timeout=10)
-        soup = BeautifulSoup(res.text, "html.parser")
+def year_start_url(year):
+    return f"{settings.BASE_URL}/AdvancedRulingSearch.aspx?searchText=&AndOr=AND&typeid=0&courtID=0&depid=0&rulNumber=0&rulYear={year}&judjes=&desicionmonth=0&DesicionDay=0&DesicionYear=0&pageNumber=1&language=ar"
+
+def parse_detail(html):
+    """Extract summary and document link from a ruling page's HTML"""
+    return get_backend(settings.HTML_BACKEND)[1](html, settings.BASE_URL)
 
-        # PDF link
-        pdf_tag = soup.find("a", id="MainContent_downloadPDF")
-        full_doc = get_full_url(pdf_tag["href"]) if pdf_tag and pdf_tag.get("href") else None
+def parse_listing(html):
+    """
+    Parse a listing page into (batch, next_href).
+    `batch` is None when the page has no results container or no blocks.
+    Entries without a link already carry empty detail fields.
+    """
+    return get_backend(settings.HTML_BACKEND)[0](html, settings.BASE_URL)
 
-        # Summary
-        summary_tag = soup.find("div", id="MainContent_RulingText")
-        summary = summary_tag.get_text(strip=True) if summary_tag else None
+def open_cache(year, use_cache=True, trust_closed=False):
+    """Detail cache for a run; trust mode is only honoured for years already closed."""
+    if not use_cache:
+        return None
+    trust = trust_closed and year < date.today().year
+    return DetailCache(settings.DETAIL_CACHE_PATH, trust=trust)
 
-        return {"link_to_full_document": full_doc, "summary": summary}
+def get_page(url, headers=None, timeout=10):
+    """
+    Blocking twin of fetch_page: GETs a page under the host's adaptive
+    concurrency limit and returns the response. 429/5xx/timeouts shrink the
+    limit and are retried with jittered backoff; returns None once
+    MAX_RETRIES attempts overloaded.
+    """
+    limiter = get_limiter(urlparse(url).netloc)
+    for attempt in range(settings.MAX_RETRIES):
+        retry_after = None
+        with limiter.slot() as slot:
+            try:
+                res = requests.get(url, headers=headers, timeout=timeout)
+                slot["latency"] = res.elapsed.total_seconds()
+                slot["outcome"] = classify_status(res.status_code)
+                if slot["outcome"] != OVERLOAD:
+                    return res
+                retry_after = res.headers.get("Retry-After")
+            except (requests.Timeout, requests.ConnectionError):
+                slot["outcome"] = OVERLOAD
+        time.sleep(backoff_delay(attempt, retry_after))
+    return None
+
+def fetch_detail(link, cache=None):
+    """Fetch summary and document link from a ruling page"""
+    cached = cache.get(link) if cache else None
+    if cached and cache.trust:
+        return cached[2]
+    try:
+        headers = conditional_headers(settings.HEADERS, cached)
+        res = get_page(link, headers=headers)
+        if res is None:
+            raise RuntimeError("server kept failing or timing out")
+        if res.status_code == 304 and cached:
+            cache.touch(link)
+            return cached[2]
+        detail = parse_detail(res.text)
+        if cache and res.status_code == 200:
+            cache.put(link, res.headers.get("ETag"), res.headers.get("Last-Modified"), detail)
+        return detail
     except Exception as e:
         print(f"⚠️ Detail fetch failed for {link}: {e}")
         return {"link_to_full_document": None, "summary": None}
 
-def scrape_year(year):
+def scrape_year(year, writer, cache=None):
+    """Reference engine: blocking requests, one thread pool per listing page, under the same adaptive limiter."""
     print(f"\n📘 Scraping year: {year}")
-    results = []
-    current_url = f"{settings.BASE_URL}/AdvancedRulingSearch.aspx?searchText=&AndOr=AND&typeid=0&courtID=0&depid=0&rulNumber=0&rulYear={year}&judjes=&desicionmonth=0&DesicionDay=0&DesicionYear=0&pageNumber=1&language=ar"
+    current_url = writer.resume_url or year_start_url(year)
 
     while True:
         print(f"🔎 Fetching: {current_url}")
-        res = requests.get(current_url, headers=settings.HEADERS)
-        soup = BeautifulSoup(res.text, "html.parser")
-
-        container = soup.find("div", id="MainContent_mainLegTr")
-        if not container:
-            break
-
-        blocks = container.find_all("div", class_="extra-wrap")
-        if not blocks:
+        res = get_page(current_url, headers=settings.HEADERS, timeout=60)
+        if res is None:
+            raise RuntimeError(f"Listing page kept failing: {current_url}")
+        batch, next_href = parse_listing(res.text)
+        if batch is None:
             break
 
-        batch = []
-        links_to_fetch = []
-
-        for block in blocks:
-            a_tag = block.find("a", href=True)
-            h4 = a_tag.find("h4") if a_tag else None
-            link = get_full_url(a_tag['href']) if a_tag else None
-            title = h4.get_text(strip=True) if h4 else None
-            list_items = block.find_all("li")
-            tags = [li.get_text(strip=True) for li in list_items]
-
-            entry = {
-                "link": link,
-                "title": title,
-                "list": tags
-            }
-
-            if link:
-                links_to_fetch.append((link, entry))
-            else:
-                entry["link_to_full_document"] = None
-                entry["summary"] = None
-
-            batch.append(entry)
+        links_to_fetch = [(entry["link"], entry) for entry in batch if entry["link"]]
 
         # Fetch details in parallel
         with ThreadPoolExecutor(max_workers=settings.MAX_THREADS) as executor:
-            future_map = {executor.submit(fetch_detail, link): entry for link, entry in links_to_fetch}
+            future_map = {executor.submit(fetch_detail, link, cache): entry for link, entry in links_to_fetch}
             for future in as_completed(future_map):
                 detail = future.result()
                 target_entry = future_map[future]
                 target_entry.update(detail)
 
-        results.extend(batch)
-
-        # Pagination check
-        next_href = None
-        for icon in soup.find_all("i", class_="fa fa-step-backward"):
-            parent_a = icon.find_parent("a", href=True)
-            parent_li = parent_a.find_parent("li") if parent_a else None
-            if parent_a and parent_li:
-                if "disabled" in parent_li.get("class", []):
-                    next_href = None
-                else:
-                    next_href = parent_a['href']
-                break
-
-        if not next_href:
+        next_url = get_full_url(next_href) if next_href else None
+        writer.write_page(current_url, next_url, batch)
+
+        if not next_url:
             break
 
-        current_url = get_full_url(next_href)
-        time.sleep(0.5)  # between page requests
+        current_url = next_url
+        time.sleep(PAGE_DELAY)  # between page requests
+
+
+# ===== ASYNC ENGINE =====
+
+async def fetch_page(http, url, headers=None, timeout=10):
+    """
+    GETs a page under the host's adaptive concurrency limit and returns
+    (status, headers, text). 429/5xx/timeouts shrink the limit and are retried
+    with jittered backoff; returns None once MAX_RETRIES attempts overloaded.
+    """
+    limiter = get_limiter(urlparse(url).netloc)
+    for attempt in range(settings.MAX_RETRIES):
+        retry_after = None
+        async with limiter.async_slot() as slot:
+            start = time.monotonic()
+            try:
+                async with http.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as res:
+                    slot["latency"] = time.monotonic() - start
+                    slot["outcome"] = classify_status(res.status)
+                    if slot["outcome"] != OVERLOAD:
+                        return res.status, res.headers, await res.text()
+                    retry_after = res.headers.get("Retry-After")
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError):
+                slot["outcome"] = OVERLOAD
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
+    return None
 
-    # Save results
-    with open(f"rulings_{year}.json", "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
-    print(f"💾 Saved {len(results)} rulings to rulings_{year}.json")
+async def fetch_detail_async(http, link, cache=None):
+    """Async twin of fetch_detail sharing the same pooled session; cache reads and writes run off the event loop"""
+    cached = await asyncio.to_thread(cache.get, link) if cache else None
+    if cached and cache.trust:
+        return cached[2]
+    try:
+        page = await fetch_page(http, link, headers=conditional_headers({}, cached))
+        if page is None:
+            raise RuntimeError("server kept failing or timing out")
+        status, headers, html = page
+        if status == 304 and cached:
+            await asyncio.to_thread(cache.touch, link)
+            return cached[2]
+        detail = parse_detail(html)
+        if cache and status == 200:
+            await asyncio.to_thread(cache.put, link, headers.get("ETag"), headers.get("Last-Modified"), detail)
+        return detail
+    except Exception as e:
+        print(f"⚠️ Detail fetch failed for {link}: {e}")
+        return {"link_to_full_document": None, "summary": None}
+
+async def fill_details(http, batch, cache=None):
+    entries = [entry for entry in batch if entry["link"]]
+    details = await asyncio.gather(*(fetch_detail_async(http, entry["link"], cache) for entry in entries))
+    for entry, detail in zip(entries, details):
+        entry.update(detail)
+    return batch
+
+def make_session():
+    """
+    One keep-alive connection pool for the whole year. The per-host adaptive
+    limiter decides how many requests are in flight, listing pages included;
+    the connector only enforces its upper bound.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=settings.ADAPTIVE_MAX,
+        limit_per_host=settings.ADAPTIVE_MAX,
+        keepalive_timeout=30,
+    )
+    return aiohttp.ClientSession(connector=connector, headers=settings.HEADERS)
+
+async def scrape_year_async(year, writer, cache=None):
+    """
+    Pipelined engine: as soon as page N is parsed its detail fetches are
+    scheduled and page N+1 is requested, so the pool never idles at a page
+    boundary. Pages are written and checkpointed in listing order, and at most
+    PIPELINE_DEPTH pages are held in memory waiting for their details.
+    """
+    print(f"\n📘 Scraping year: {year}")
+    pending = deque()
+    current_url = writer.resume_url or year_start_url(year)
+
+    async def flush_oldest():
+        page_url, next_url, task = pending.popleft()
+        writer.write_page(page_url, next_url, await task)
+
+    async with make_session() as http:
+        try:
+            while True:
+                print(f"🔎 Fetching: {current_url}")
+                page = await fetch_page(http, current_url, timeout=60)
+                if page is None:
+                    raise RuntimeError(f"Listing page kept failing: {current_url}")
+                batch, next_href = parse_listing(page[2])
+                if batch is None:
+                    break
+
+                next_url = get_full_url(next_href) if next_href else None
+                pending.append((current_url, next_url, asyncio.create_task(fill_details(http, batch, cache))))
+                while len(pending) > PIPELINE_DEPTH:
+                    await flush_oldest()
+
+                if not next_url:
+                    break
+
+                current_url = next_url
+                await asyncio.sleep(PAGE_DELAY)  # between page requests
+
+            while pending:
+                await flush_oldest()
+        finally:
+            # 👈 on failure, stop the detail fetches of unwritten pages before the session closes
+            tasks = [task for _, _, task in pending]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+def run(year, engine="async", use_cache=True, trust_closed=False, resume=True):
+    writer = RulingsWriter(year, resume=resume)
+    if writer.done:
+        print(f"✅ {writer.path} already complete ({writer.count} rulings), use --restart to scrape again")
+        writer.close()
+        return
+    if writer.resume_url:
+        print(f"⏩ Resuming {year} after {writer.checkpoint['page_url']} ({writer.count} rulings so far)")
+
+    cache = open_cache(year, use_cache, trust_closed)
+    try:
+        if engine == "async":
+            asyncio.run(scrape_year_async(year, writer, cache))
+        else:
+            scrape_year(year, writer, cache)
+        writer.finish()
+        print(f"💾 Saved {writer.count} rulings to {writer.path}")
+    finally:
+        writer.close()
+        if cache:
+            cache.close()
 
 
 # ===== MAIN: Accept year from CLI =====
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--year", type=int, required=True, help="Year to scrape")
+    parser.add_argument("--engine", choices=["async", "threads"], default="async", help="Scraping engine")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the detail page cache")
+    parser.add_argument("--trust-cache", action="store_true", help="Reuse cached details without revalidating (closed years only)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and scrape the year from page 1")
     args = parser.parse_args()
 
     try:
-        scrape_year(args.year)
+        run(args.year, engine=args.engine, use_cache=not args.no_cache, trust_closed=args.trust_cache, resume=not args.restart)
     except Exception as e:
         print(f"❗ Failed year {args.year}: {e}")
@@ -0,0 +1,65 @@
+import re
+import subprocess
+from utilities import settings
+
+
+ARABIC_LETTER = re.compile(r"[\u0621-\u064A\u0671-\u06D3]")
+PRESENTATION_FORM = re.compile(r"[\uFB50-\uFDFF\uFE70-\uFEFF]")
+ARABIC_WORD = re.compile(r"[\u0621-\u064A\u0671-\u06D3]+")
+
+# Frequent function words (no palindromes); text extracted in visual (reversed)
+# order or with broken ligatures barely contains them or the "ال" article,
+# correctly extracted prose is full of both.
+COMMON_WORDS = {
+    "في", "من", "على", "إلى", "الى", "أن", "ان", "عن", "التي", "الذي", "هذا",
+    "مع", "قد", "لا", "ما", "بين", "كان", "أو", "او", "لم", "ذلك", "بعد", "حيث", "المحكمة",
+}
+
+
+def extract_text_pages(pdf_path, page_count):
+    """Returns the embedded text of each page (empty strings for a PDF without a text layer)."""
+    result = subprocess.run(
+        ["pdftotext", "-enc", "UTF-8", pdf_path, "-"],
+        capture_output=True, timeout=300, check=True
+    )
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    pages += [""] * (page_count - len(pages))
+    return pages[:page_count]
+
+
+def score_arabic_text(text):
+    """
+    Scores extracted Arabic text between 0 and 1.
+
+    Combines the share of Arabic among all letters, a penalty for presentation
+    forms (a sign of glyph-level extraction), and how many words are common
+    function words or carry the "ال" article, which catches reversed or
+    garbled word order.
+    """
+    letters = [c for c in text if c.isalpha()]
+    arabic = ARABIC_LETTER.findall(text)
+    if len(arabic) < settings.TEXT_LAYER_MIN_CHARS:
+        return 0.0
+
+    arabic_ratio = len(arabic) / len(letters)
+    presentation_ratio = len(PRESENTATION_FORM.findall(text)) / len(letters)
+    words = ARABIC_WORD.findall(text)
+    hits = sum(1 for w in words if w in COMMON_WORDS or (w.startswith("ال") and len(w) > 3))
+    hit_rate = hits / len(words) if words else 0.0
+
+    return arabic_ratio * (1 - presentation_ratio) * min(1.0, hit_rate / 0.25)
+
+
+def usable_text_pages(pdf_path, page_count):
+    """Returns {page_number: text} for the pages whose text layer can replace OCR."""
+    if not settings.TEXT_LAYER_ENABLED:
+        return {}
+    try:
+        pages = extract_text_pages(pdf_path, page_count)
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    return {
+        i: text.strip()
+        for i, text in enumerate(pages, 1)
+        if score_arabic_text(text) >= settings.TEXT_LAYER_MIN_SCORE
+    }
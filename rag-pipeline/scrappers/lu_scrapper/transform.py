@@ -1,12 +1,19 @@
 import os
-import io
+import json
 import boto3
 import logging
 import argparse
-from pdf2image import convert_from_bytes
+import time
+import tempfile
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
 from botocore.exceptions import ClientError
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
 from utilities import settings
+from utilities.storage.s3 import list_objects
+from text_layer import usable_text_pages
+from encoding_profiles import PROFILES, get_profile, encode_page
+from upload_pipeline import UploadPipeline
 import sys
 import os
 
@@ -29,80 +36,271 @@ logging.basicConfig(
 )
 
 # ==== INIT BOTO3 SESSION ====
-session = boto3.Session(
-    profile_name=settings.PROFILE_NAME,
-    region_name=settings.REGION_NAME
-)
-s3 = session.client("s3")
+def make_s3_client():
+    session = boto3.Session(
+        profile_name=settings.PROFILE_NAME,
+        region_name=settings.REGION_NAME
+    )
+    return session.client("s3")
+
+s3 = make_s3_client()
+
+
+def init_worker():
+    """Each rasterization process gets its own client; boto3 clients are not fork-safe."""
+    global s3
+    s3 = make_s3_client()
+
+
+def make_pipeline():
+    """An upload pipeline for one PDF; leaving its `with` block drains and joins the upload threads."""
+    return UploadPipeline(
+        s3, settings.DEST_BUCKET,
+        workers=settings.UPLOAD_WORKERS,
+        max_pending=settings.UPLOAD_QUEUE_SIZE
+    )
+
+MANIFEST_NAME = "_manifest.json"  # written last, marks a fully rasterized PDF
 
 
 def list_pdfs_in_year(bucket, year):
-    paginator = s3.get_paginator('list_objects_v2')
-    pages = paginator.paginate(Bucket=bucket, Prefix=f"{year}/")
+    """Returns {key: {size, etag, last_modified}} for the year's PDFs."""
+    objects = list_objects(s3, bucket, f"{year}/")
+    return {key: obj for key, obj in objects.items() if key.endswith(".pdf")}
+
+
+def manifest_key(year, file_base):
+    return f"{year}/{file_base}/{MANIFEST_NAME}"
 
-    files = []
-    for page in pages:
-        for obj in page.get('Contents', []):
-            key = obj['Key']
-            if key.endswith(".pdf"):
-                files.append(key)
-    return files
+
+def is_complete(key, pdf_obj, existing):
+    """
+    A PDF is done when its manifest exists and is newer than the PDF itself,
+    i.e. the source was not replaced after it was rasterized.
+    """
+    year = key.split('/')[0]
+    file_base = os.path.splitext(os.path.basename(key))[0]
+    manifest = existing.get(manifest_key(year, file_base))
+    return bool(manifest) and manifest["last_modified"] >= pdf_obj["last_modified"]
 
 
-def download_pdf(bucket, key):
+def write_manifest(year, file_base, pages, source_etag, text_pages=()):
+    manifest = {"pages": pages, "source_etag": source_etag, "text_pages": list(text_pages)}
+    s3.put_object(
+        Bucket=settings.DEST_BUCKET,
+        Key=manifest_key(year, file_base),
+        Body=json.dumps(manifest).encode("utf-8"),
+        ContentType="application/json"
+    )
+
+
+PAGE_SUFFIXES = (".txt",) + tuple(sorted({f".{p.extension}" for p in PROFILES.values()}))
+
+def stale_page_keys(existing, kept, suffixes):
+    """
+    Page files (N.<suffix>) of an earlier run that this run did not write,
+    e.g. N.jpg after page N moved to the text route, or N.png after
+    IMAGE_PROFILE switched to jpg: Cleaning would otherwise OCR the leftover
+    too and overwrite the new page.
+    """
+    stale = []
+    for key in existing:
+        name, suffix = os.path.splitext(os.path.basename(key))
+        if name.isdigit() and suffix in suffixes and key not in kept:
+            stale.append(key)
+    return stale
+
+
+def delete_keys(keys):
+    for start in range(0, len(keys), 1000):
+        resp = s3.delete_objects(
+            Bucket=settings.DEST_BUCKET,
+            Delete={"Objects": [{"Key": key} for key in keys[start:start + 1000]], "Quiet": True}
+        )
+        if resp.get("Errors"):
+            raise RuntimeError(f"{len(resp['Errors'])} objects not deleted, e.g. {resp['Errors'][0]}")
+
+
+def download_pdf(bucket, key, path):
     try:
-        response = s3.get_object(Bucket=bucket, Key=key)
-        return response['Body'].read()
+        s3.download_file(bucket, key, path)
+        return True
     except ClientError as e:
         msg = f"Download failed: {key} -> {e}"
         print(msg)
         logging.error(msg)
-        return None
+        return False
 
 
-def upload_images(images, year, file_base):
-    for i, image in enumerate(images):
-        try:
-            img_buffer = io.BytesIO()
-            image.save(img_buffer, format='JPEG')
-            img_buffer.seek(0)
-            key = f"{year}/{file_base}/{i+1}.jpg"
-            s3.put_object(
-                Bucket=settings.DEST_BUCKET,
-                Key=key,
-                Body=img_buffer,
-                ContentType='image/jpeg'
-            )
-        except Exception as e:
-            msg = f"Upload failed: {year}/{file_base}/{i+1}.jpg -> {e}"
+def page_windows(page_numbers):
+    """Splits sorted page numbers into contiguous (first, last) runs of at most RASTER_WINDOW pages."""
+    window = max(1, settings.RASTER_WINDOW)
+    first = last = None
+    for page in page_numbers:
+        if first is not None and page == last + 1 and page - first < window:
+            last = page
+            continue
+        if first is not None:
+            yield first, last
+        first = last = page
+    if first is not None:
+        yield first, last
+
+
+def render_windows(pdf_path, page_numbers, work_dir, dpi=200, stats=None):
+    """
+    Renders the given pages RASTER_WINDOW at a time to files in `work_dir` and
+    yields (page_number, path) in order, so only one window of rendered pages
+    exists at any moment, on disk rather than in memory.
+    """
+    for first, last in page_windows(page_numbers):
+        start = time.perf_counter()
+        paths = convert_from_path(
+            pdf_path, dpi=dpi, first_page=first, last_page=last,
+            output_folder=work_dir, fmt="ppm", paths_only=True
+        )
+        if stats is not None:
+            stats["render_s"] += time.perf_counter() - start
+        for page_number, path in zip(range(first, last + 1), sorted(paths)):
+            yield page_number, path
+
+
+def new_stats():
+    return {"pdfs": 0, "pages": 0, "failed": 0, "bytes": 0,
+            "render_s": 0.0, "encode_s": 0.0, "upload_s": 0.0}
+
+
+def collect_uploads(uploads, stats):
+    """Waits for a document's uploads and adds them to `stats`; returns the pages stored."""
+    wait([future for _, future in uploads])
+    uploaded = 0
+    for key, future in uploads:
+        if future.cancelled():
+            stats["failed"] += 1
+        elif future.exception() is not None:
+            msg = f"Upload failed: {key} -> {future.exception()}"
             print(msg)
             logging.error(msg)
+            stats["failed"] += 1
+        else:
+            size, seconds = future.result()
+            stats["bytes"] += size
+            stats["upload_s"] += seconds
+            uploaded += 1
+    stats["pages"] += uploaded
+    return uploaded
+
 
+def process_pdf(key, source_etag=None):
+    """
+    Downloads one PDF, queues pages with a good text layer as N.txt and
+    rasterizes the rest page by page with the IMAGE_PROFILE encoding
+    (N.jpg or N.png). Encoded pages go to the PDF's upload pipeline, so
+    the next page renders while earlier ones are still uploading; the
+    pipeline is drained and closed before returning, on errors too. Page
+    files of an earlier run under the other route are removed before the
+    manifest is written.
 
-def process_pdf(key):
+    Returns the per-stage counters for this PDF (see `new_stats`).
+    """
     year = key.split('/')[0]
     file_base = os.path.splitext(os.path.basename(key))[0]
+    profile = get_profile(settings.IMAGE_PROFILE)
+    stats = new_stats()
+    uploads = []
 
-    pdf_bytes = download_pdf(settings.SOURCE_BUCKET, key)
-    if not pdf_bytes:
-        return
+    def failed_upload():
+        return any(f.done() and not f.cancelled() and f.exception() for _, f in uploads)
 
+    with tempfile.TemporaryDirectory() as work_dir, make_pipeline() as uploader:
+        pdf_path = os.path.join(work_dir, "source.pdf")
+        if not download_pdf(settings.SOURCE_BUCKET, key, pdf_path):
+            return stats
+
+        try:
+            previous = list_objects(s3, settings.DEST_BUCKET, f"{year}/{file_base}/")
+            page_count = int(pdfinfo_from_path(pdf_path)["Pages"])
+
+            # Born-digital pages skip rasterization, layout detection and OCR
+            text_pages = usable_text_pages(pdf_path, page_count)
+            for page_number, text in text_pages.items():
+                page_key = f"{year}/{file_base}/{page_number}.txt"
+                uploads.append((page_key, uploader.submit(
+                    page_key, text.encode("utf-8"), 'text/plain; charset=utf-8')))
+
+            image_pages = [p for p in range(1, page_count + 1) if p not in text_pages]
+            for page_number, path in render_windows(pdf_path, image_pages, work_dir, profile.dpi, stats):
+                # A lost page means no manifest, so stop spending CPU on this PDF
+                if failed_upload():
+                    break
+                with Image.open(path) as image:
+                    start = time.perf_counter()
+                    body = encode_page(image, profile)
+                    stats["encode_s"] += time.perf_counter() - start
+                os.remove(path)
+                page_key = f"{year}/{file_base}/{page_number}.{profile.extension}"
+                uploads.append((page_key, uploader.submit(page_key, body, profile.content_type)))
+        except Exception as e:
+            msg = f"Conversion failed: {key} -> {e}"
+            print(msg)
+            logging.error(msg)
+            for _, future in uploads:
+                future.cancel()
+            uploader.close()  # 👈 uploads already running finish before we account for them
+            collect_uploads(uploads, stats)
+            return stats
+
+        uploaded = collect_uploads(uploads, stats)
+    if uploaded != page_count:
+        return stats
     try:
-        images = convert_from_bytes(pdf_bytes)
+        delete_keys(stale_page_keys(previous, {key for key, _ in uploads}, PAGE_SUFFIXES))
     except Exception as e:
-        msg = f"Conversion failed: {key} -> {e}"
+        msg = f"Removing stale pages failed: {key} -> {e}"  # no manifest, so the next run retries
         print(msg)
         logging.error(msg)
-        return
+        return stats
+    write_manifest(year, file_base, page_count, source_etag, sorted(text_pages))
+    stats["pdfs"] += 1
+    return stats
+
+
+def report_stats(stats, elapsed):
+    """Prints pages per second of busy time for each stage, and overall."""
+    def rate(seconds):
+        return f"{stats['pages'] / seconds:.1f} pages/s" if seconds else "-"
+    print(f"📊 render {rate(stats['render_s'])}, encode {rate(stats['encode_s'])}, "
+          f"upload {rate(stats['upload_s'])} per thread, "
+          f"{stats['bytes'] / 1024 / 1024:.1f} MiB sent, {stats['failed']} failed, "
+          f"overall {rate(elapsed)}")
+
 
-    upload_images(images, year, file_base)
+def make_raster_pool(mp_context=None):
+    # Rendering and JPEG encoding are CPU-bound, so PDFs run in separate processes
+    workers = settings.RASTER_PROCESSES or os.cpu_count() or 1
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker, mp_context=mp_context)
 
 
-def main(year):
+def rasterize(todo, executor):
+    """Runs process_pdf for every PDF in `todo` on `executor`; returns the summed counters."""
+    totals = new_stats()
+    futures = [executor.submit(process_pdf, key, obj["etag"]) for key, obj in todo.items()]
+    for future in as_completed(futures):
+        try:
+            for name, value in future.result().items():
+                totals[name] += value
+        except Exception as e:
+            logging.error(f"Unhandled exception in worker: {e}")
+    return totals
+
+
+def main(year, force=False, executor=None):
+    """Rasterizes the year's PDFs; `executor` lets several years share one process pool."""
     print(f"🔍 Processing PDFs from year: {year}")
 
     try:
         pdfs = list_pdfs_in_year(settings.SOURCE_BUCKET, str(year))
+        existing = {} if force else list_objects(s3, settings.DEST_BUCKET, f"{year}/")
     except Exception as e:
         msg = f"Listing PDFs failed for year {year}: {e}"
         print(msg)
@@ -113,20 +311,24 @@ def main(year):
         print(f"⚠️ No PDFs found for year {year}")
         return
 
-    print(f"▶️ Found {len(pdfs)} PDFs in {year}. Starting processing...")
+    todo = {key: obj for key, obj in pdfs.items() if not is_complete(key, obj, existing)}
+    print(f"▶️ Found {len(pdfs)} PDFs in {year}, {len(pdfs) - len(todo)} already rasterized. Starting processing...")
+
+    start = time.perf_counter()
+    if executor is None:
+        with make_raster_pool() as executor:
+            totals = rasterize(todo, executor)
+    else:
+        totals = rasterize(todo, executor)
 
-    with ThreadPoolExecutor(max_workers=settings.MAX_WORKERS) as executor:
-        futures = [executor.submit(process_pdf, key) for key in pdfs]
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                logging.error(f"Unhandled exception in worker: {e}")
+    print(f"✅ Uploaded {totals['pages']} pages, {totals['pdfs']}/{len(todo)} PDFs complete in {year}")
+    report_stats(totals, time.perf_counter() - start)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--year", type=int, required=True, help="Year to process from S3")
+    parser.add_argument("--force", action="store_true", help="Rasterize PDFs that already have a manifest")
     args = parser.parse_args()
 
-    main(args.year)
+    main(args.year, force=args.force)
@@ -0,0 +1,40 @@
+import time
+from utilities.concurrency import BoundedExecutor
+
+
+class UploadPipeline:
+    """
+    Bounded producer-consumer hand-off from rasterize/encode code to S3 upload threads.
+
+    Producers call `submit` with an encoded page; a pool of upload threads
+    sends it with put_object. At most `max_pending` pages are queued or in
+    flight, after which `submit` blocks, so a fast renderer cannot pile up
+    encoded pages in memory while the network catches up.
+
+    Each submit returns a Future resolving to (bytes_sent, seconds) or raising
+    the upload error, so callers can account per document. Used as a context
+    manager, the upload threads are drained and joined on exit, errors included.
+    """
+
+    def __init__(self, s3, bucket, workers=8, max_pending=16):
+        self.s3 = s3
+        self.bucket = bucket
+        self._executor = BoundedExecutor(workers, max_pending, thread_name_prefix="s3-upload")
+
+    def submit(self, key, body, content_type):
+        return self._executor.submit(self._upload, key, body, content_type)
+
+    def _upload(self, key, body, content_type):
+        start = time.perf_counter()
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+        return len(body), time.perf_counter() - start
+
+    def close(self):
+        """Waits for the queued uploads and stops the upload threads."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,13 +1,18 @@
 import os
 import glob
 import json
+import time
 import requests
 import argparse
+import tempfile
 from urllib.parse import urlparse, parse_qs
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from rulings_io import iter_rulings, find_rulings_file
+from adaptive import get_limiter, classify_status, backoff_delay, OVERLOAD, ERROR
 from utilities import settings
+from utilities.storage.s3 import upload_stream, list_objects
 import sys
 import os
 
@@ -66,25 +71,93 @@ def upload_enriched_json_to_s3(filepath, year):
         print(f"❌ Failed to upload enriched JSON: {e}")
 
 
-def download_pdf(url):
-    for _ in range(settings.MAX_RETRIES):
-        try:
-            r = requests.get(url, headers=settings.HEADERS, timeout=10)
-            if r.status_code == 200:
-                return r.content
-        except Exception:
-            continue
-    print(f"❌ Failed to download PDF: {url}")
+def fetch_pdf(url, receive):
+    """
+    GETs a PDF under the court website's adaptive concurrency limit and returns
+    `receive(response)` for a 200. `receive` only reads the body: the slot is
+    released as soon as it returns, so what the caller does next (the S3
+    upload) neither holds a slot nor counts in the latency the limiter sees.
+    429/5xx/timeouts shrink the limit and are retried with jittered backoff;
+    other failures are not retried.
+    """
+    limiter = get_limiter(urlparse(url).netloc)
+    for attempt in range(settings.MAX_RETRIES):
+        retry_after = None
+        with limiter.slot() as slot:
+            try:
+                with requests.get(url, headers=settings.HEADERS, timeout=10, stream=True) as r:
+                    slot["latency"] = r.elapsed.total_seconds()
+                    slot["outcome"] = classify_status(r.status_code)
+                    if r.status_code == 200:
+                        return receive(r)
+                    retry_after = r.headers.get("Retry-After")
+            except (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                slot["outcome"] = OVERLOAD
+            except requests.RequestException:
+                slot["outcome"] = ERROR
+        if slot["outcome"] != OVERLOAD:
+            break
+        time.sleep(backoff_delay(attempt, retry_after))
     return None
 
 
-def process_file(filepath, year):
+def download_pdf(url):
+    content = fetch_pdf(url, lambda r: r.content)
+    if content is None:
+        print(f"❌ Failed to download PDF: {url}")
+    return content
+
+
+def spool_body(r):
+    """The response body in a temporary file: in memory up to one part, on disk beyond."""
+    body = tempfile.SpooledTemporaryFile(max_size=settings.TRANSFER_PART_SIZE)
+    try:
+        for chunk in r.iter_content(chunk_size=settings.TRANSFER_CHUNK_SIZE):
+            body.write(chunk)
+    except BaseException:
+        body.close()
+        raise
+    body.seek(0)
+    return body
+
+
+def stream_pdf_to_s3(url, year, doc_id):
+    """
+    Spools the PDF from the website, then streams it into S3 in
+    TRANSFER_PART_SIZE parts, so memory per worker stays bounded whatever the
+    size of the document and the website's slot is free during the upload.
+    """
+    s3_key = f"{year}/{doc_id}.pdf"
+
+    body = fetch_pdf(url, spool_body)
+    if body is None:
+        print(f"❌ Failed to download PDF: {url}")
+        return None
+    try:
+        with body:
+            chunks = iter(lambda: body.read(settings.TRANSFER_CHUNK_SIZE), b"")
+            upload_stream(s3, chunks, settings.S3_BUCKET, s3_key, settings.TRANSFER_PART_SIZE, "application/pdf")
+    except (BotoCoreError, ClientError) as e:
+        print(f"❌ S3 error for {doc_id}: {e}")
+        return None
+    print(f"✅ Uploaded PDF: s3://{settings.S3_BUCKET}/{s3_key}")
+    return f"s3://{settings.S3_BUCKET}/{s3_key}"
+
+
+def process_file(filepath, year, force=False, entries=None):
+    """
+    Uploads the PDF of every ruling in `filepath` and writes the enriched
+    rulings to OUTPUT_FOLDER. `entries` replaces reading the file, e.g. to
+    follow a JSONL that is still being scraped.
+    """
     filename = os.path.basename(filepath)
 
     print(f"\n📄 Processing: {filename}")
 
-    with open(filepath, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    # One listing of the year prefix up front instead of a request per document
+    existing = {} if force else list_objects(s3, settings.S3_BUCKET, f"{year}/")
+    if existing:
+        print(f"🗂️ {len(existing)} objects already in s3://{settings.S3_BUCKET}/{year}/")
 
     def process_entry(entry):
         pdf_url = entry.get("link_to_full_document")
@@ -96,31 +169,53 @@ def process_file(filepath, year):
             print(f"⚠️ Skipping: can't extract RuliID from {pdf_url}")
             return None
 
-        pdf_content = download_pdf(pdf_url)
-        if not pdf_content:
-            return None
-
-        s3_path = upload_to_s3(pdf_content, year, doc_id)
+        s3_key = f"{year}/{doc_id}.pdf"
+        if existing.get(s3_key, {}).get("size"):
+            entry["s3_pdf_path"] = f"s3://{settings.S3_BUCKET}/{s3_key}"
+            return entry
+
+        if settings.TRANSFER_MODE == "stream":
+            s3_path = stream_pdf_to_s3(pdf_url, year, doc_id)
+        else:
+            pdf_content = download_pdf(pdf_url)
+            if not pdf_content:
+                return None
+            s3_path = upload_to_s3(pdf_content, year, doc_id)
         entry["s3_pdf_path"] = s3_path
         return entry
 
-    enriched_data = []
-
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        futures = {executor.submit(process_entry, entry): entry for entry in data}
-
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                enriched_data.append(result)
-            else:
-                enriched_data.append(futures[future])  # Preserve entry even if failed
-
-    # Save enriched file
     os.makedirs(settings.OUTPUT_FOLDER, exist_ok=True)
     output_path = os.path.join(settings.OUTPUT_FOLDER, filename)
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(enriched_data, f, ensure_ascii=False, indent=2)
+    streaming = filepath.endswith(".jsonl")
+    enriched_data = []
+
+    # The shared limiter decides how many of these threads hit the website at once
+    max_workers = settings.PDF_WORKERS
+
+    # Entries are read one by one with a bounded number in flight, and enriched
+    # entries are appended as they complete, so JSONL input never has to be
+    # held in memory as a whole.
+    with open(output_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+
+        def collect(done):
+            for future in done:
+                entry = futures.pop(future)
+                enriched = future.result() or entry  # Preserve entry even if failed
+                if streaming:
+                    out.write(json.dumps(enriched, ensure_ascii=False) + "\n")
+                else:
+                    enriched_data.append(enriched)
+
+        for entry in entries if entries is not None else iter_rulings(filepath):
+            futures[executor.submit(process_entry, entry)] = entry
+            if len(futures) >= 2 * max_workers:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(as_completed(list(futures)))
+
+        if not streaming:
+            json.dump(enriched_data, out, ensure_ascii=False, indent=2)
 
     print(f"💾 Enriched file saved: {output_path}")
 
@@ -132,11 +227,12 @@ def process_file(filepath, year):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--year", type=int, required=True, help="Year to process")
+    parser.add_argument("--force", action="store_true", help="Re-download PDFs that are already in S3")
     args = parser.parse_args()
     year = args.year
 
-    input_file = f"rulings_{year}.json"
-    if not os.path.exists(input_file):
-        print(f"❌ File not found: {input_file}")
+    input_file = find_rulings_file(year)
+    if not input_file:
+        print(f"❌ File not found: rulings_{year}.jsonl")
     else:
-        process_file(input_file, year)
+        process_file(input_file, year, force=args.force)
@@ -6,16 +6,34 @@ class Settings(BaseSettings):
     BASE_URL: str
     HEADERS: dict = {"User-Agent": "Mozilla/5.0"}
     MAX_THREADS: int = 10
+    ADAPTIVE_INITIAL: int = 8
+    ADAPTIVE_MIN: int = 1
+    ADAPTIVE_MAX: int = 40
+    PDF_WORKERS: int = 20  # upload_to_s3 threads; website requests stay under the adaptive limit
+    YEAR_CONCURRENCY: int = 3  # years main.py runs at once
+    DETAIL_CACHE_PATH: str = "detail_cache.sqlite"
+    HTML_BACKEND: str = "bs4"  # "lxml" is faster; check it first with bench_extraction.py --fixtures
     SOURCE_BUCKET: str
     DEST_BUCKET: str
     PROFILE_NAME: str
     REGION_NAME: str
     MAX_WORKERS: int = 10
+    RASTER_PROCESSES: int = 0  # 0 = one per CPU core
+    RASTER_WINDOW: int = 8
+    IMAGE_PROFILE: str = "default"
+    UPLOAD_WORKERS: int = 8  # S3 upload threads per rasterization process
+    UPLOAD_QUEUE_SIZE: int = 16  # encoded pages waiting or in flight before rendering blocks
+    TEXT_LAYER_ENABLED: bool = False  # opt-in; `transform.py --force` moves rasterized years over (old N.jpg are removed)
+    TEXT_LAYER_MIN_SCORE: float = 0.6
+    TEXT_LAYER_MIN_CHARS: int = 200
     LOG_FILE: str = "errors.log"
     INPUT_GLOB: str = "rulings_*.json"
     OUTPUT_FOLDER: str = "enriched_rulings"
     S3_BUCKET: str
     MAX_RETRIES: int = 3
+    TRANSFER_MODE: str = "stream"
+    TRANSFER_PART_SIZE: int = 8 * 1024 * 1024
+    TRANSFER_CHUNK_SIZE: int = 64 * 1024
     AWS_PROFILE: str
     project_id: str
     location: str
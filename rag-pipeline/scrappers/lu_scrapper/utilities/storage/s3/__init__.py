@@ -0,0 +1 @@
+from .main import upload_stream, list_objects
@@ -0,0 +1,77 @@
+def upload_stream(s3, chunks, bucket, key, part_size, content_type="application/octet-stream"):
+    """
+    Uploads an iterable of byte chunks to S3 without holding the whole object.
+
+    Chunks are gathered into fixed-size parts and sent with a multipart upload,
+    so at most one part is buffered at a time. Objects smaller than one part
+    are sent with a single put_object. A failed transfer aborts the multipart
+    upload so no orphaned parts are left behind.
+
+    Parameters:
+    - s3: A boto3 S3 client.
+    - chunks (Iterable[bytes]): The object body, e.g. `response.iter_content(...)`.
+    - part_size (int): Bytes per part; S3 requires at least 5 MiB for all but the last part.
+
+    Returns:
+    - int: The number of bytes uploaded.
+    """
+    buffer = bytearray()
+    upload_id = None
+    parts = []
+    total = 0
+
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            buffer += chunk
+            total += len(chunk)
+            while len(buffer) >= part_size:
+                if upload_id is None:
+                    upload_id = s3.create_multipart_upload(
+                        Bucket=bucket, Key=key, ContentType=content_type
+                    )["UploadId"]
+                part = bytes(buffer[:part_size])
+                del buffer[:part_size]
+                parts.append(upload_part(s3, bucket, key, upload_id, len(parts) + 1, part))
+
+        if upload_id is None:
+            s3.put_object(Bucket=bucket, Key=key, Body=bytes(buffer), ContentType=content_type)
+            return total
+
+        if buffer:
+            parts.append(upload_part(s3, bucket, key, upload_id, len(parts) + 1, bytes(buffer)))
+        s3.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+        return total
+    except BaseException:
+        if upload_id is not None:
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+
+def upload_part(s3, bucket, key, upload_id, part_number, body):
+    resp = s3.upload_part(
+        Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body
+    )
+    return {"ETag": resp["ETag"], "PartNumber": part_number}
+
+
+def list_objects(s3, bucket, prefix):
+    """
+    Lists every object under a prefix with one paginated scan.
+
+    Returns:
+    - dict: key -> {"size": int, "etag": str, "last_modified": datetime}
+    """
+    objects = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            objects[obj["Key"]] = {
+                "size": obj["Size"],
+                "etag": obj["ETag"].strip('"'),
+                "last_modified": obj["LastModified"],
+            }
+    return objects